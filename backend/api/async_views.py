@@ -0,0 +1,154 @@
+import asyncio
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial, wraps
+from threading import Event
+
+from django.conf import settings
+from django.db import close_old_connections
+
+from api.urls import router
+from recipes.shortlinks import decode, short_links
+from recipes.views import redirect_to_recipe
+
+# Каждый поток держит своё соединение с базой, поэтому размер пула
+# ограничивает и число соединений одного воркера.
+executor = ThreadPoolExecutor(
+    settings.ASYNC_THREAD_POOL_SIZE, thread_name_prefix='orm'
+)
+# Потоковый ответ передаётся из пула частями не меньше STREAM_CHUNK_SIZE,
+# и впереди медленного клиента готовится не больше STREAM_BUFFER_CHUNKS.
+STREAM_CHUNK_SIZE = 64 * 1024
+STREAM_BUFFER_CHUNKS = 4
+
+
+def call_with_connections(func, *args, **kwargs):
+    """Вызывает func как отдельный запрос: устаревшие соединения с базой
+    закрываются до и после, как при обычной обработке запроса."""
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_in_pool(func, *args, **kwargs):
+    """Выполняет синхронную func в пуле потоков, не блокируя цикл
+    событий."""
+    return await asyncio.get_running_loop().run_in_executor(
+        executor, partial(call_with_connections, func, *args, **kwargs)
+    )
+
+
+def render_view(view, request, *args, **kwargs):
+    response = view(request, *args, **kwargs)
+    if callable(getattr(response, 'render', None)):
+        response.render()
+    return response
+
+
+def join_chunks(chunks, size=STREAM_CHUNK_SIZE):
+    buffer = []
+    length = 0
+    for chunk in chunks:
+        buffer.append(chunk)
+        length += len(chunk)
+        if length >= size:
+            yield b''.join(buffer)
+            buffer = []
+            length = 0
+    if buffer:
+        yield b''.join(buffer)
+
+
+async def stream_from_pool(chunks):
+    """Асинхронный итератор по синхронному chunks.
+
+    chunks целиком читается в одном потоке пула (курсор базы привязан
+    к соединению потока) и передаётся через ограниченную очередь: поток
+    ждёт, пока клиент не заберёт уже готовые части.
+    """
+    loop = asyncio.get_running_loop()
+    queue = asyncio.Queue(STREAM_BUFFER_CHUNKS)
+    stopped = Event()
+
+    def put(chunk):
+        asyncio.run_coroutine_threadsafe(queue.put(chunk), loop).result()
+
+    def produce():
+        try:
+            for chunk in join_chunks(chunks):
+                # После отключения клиента дочитываем без отправки:
+                # курсоры закрываются здесь, пока соединение открыто.
+                if not stopped.is_set():
+                    put(chunk)
+        finally:
+            put(None)
+
+    producer = asyncio.ensure_future(run_in_pool(produce))
+    try:
+        while True:
+            chunk = await queue.get()
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        # Клиент мог отключиться: освобождаем очередь, чтобы поток
+        # не ждал места в ней, и дожидаемся его завершения.
+        stopped.set()
+        while not queue.empty():
+            queue.get_nowait()
+        await producer
+
+
+def offload(view):
+    """Асинхронное представление, которое обрабатывает запрос синхронным
+    view в пуле потоков и там же рендерит ответ.
+
+    Содержимое потокового ответа отдаётся обработчику ASGI асинхронным
+    итератором async_streaming_content.
+    """
+    @wraps(view)
+    async def async_view(request, *args, **kwargs):
+        response = await run_in_pool(
+            render_view, view, request, *args, **kwargs
+        )
+        if response.streaming:
+            response.async_streaming_content = stream_from_pool(
+                response.streaming_content
+            )
+            response.streaming_content = ()
+        return response
+    return async_view
+
+
+views = {pattern.name: pattern.callback for pattern in router.urls}
+recipe_list = offload(views['recipe-list'])
+recipe_detail = offload(views['recipe-detail'])
+download_shopping_cart = offload(views['recipe-download-shopping-cart'])
+tag_list = offload(views['tags-list'])
+tag_detail = offload(views['tags-detail'])
+ingredient_list = offload(views['ingredient-list'])
+ingredient_detail = offload(views['ingredient-detail'])
+
+
+async def recipe_exists(recipe_id):
+    """Переход по популярной ссылке отвечает из кэша прямо в цикле
+    событий, в пул уходят только промахи."""
+    found = short_links.cached(recipe_id)
+    if found is None:
+        found = await run_in_pool(short_links.exists, recipe_id)
+    return found
+
+
+async def redirect_short_link(request, code):
+    recipe_id = decode(code)
+    return redirect_to_recipe(
+        recipe_id if recipe_id is not None and await recipe_exists(recipe_id)
+        else None
+    )
+
+
+async def redirect_legacy_short_link(request, short_id):
+    return redirect_to_recipe(
+        short_id if await recipe_exists(short_id) else None
+    )
@@ -0,0 +1,185 @@
+from functools import partial
+from hashlib import md5
+from time import monotonic, sleep
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+PAGINATION_COUNTS = 'pagination-counts'
+RECIPE_LIST = 'recipe-list'
+RESPONSE_CACHE_STATS = 'response-cache-stats'
+TAGS = 'tags'
+INGREDIENTS = 'ingredients'
+# Меняется при создании и удалении рецептов.
+SHORT_LINKS = 'short-links'
+# Сколько держать блокировку на построение записи и сколько её ждать.
+BUILD_LOCK_TIMEOUT = 10
+BUILD_WAIT_TIMEOUT = 0.5
+BUILD_POLL_INTERVAL = 0.02
+
+
+def version_key(name):
+    return f'version:{name}'
+
+
+def recipe_version(recipe_id):
+    return f'recipe:{recipe_id}'
+
+
+def user_version(user_id):
+    return f'user:{user_id}'
+
+
+def viewer_version(user_id):
+    """Версия избранного, корзины и подписок пользователя."""
+    return f'viewer:{user_id}'
+
+
+def get_versions(names):
+    """Текущие версии именованных наборов кэшированных данных."""
+    keys = {name: version_key(name) for name in names}
+    found = cache.get_many(keys.values())
+    versions = {}
+    for name, key in keys.items():
+        version = found.get(key)
+        if version is None:
+            version = uuid4().hex
+            if not cache.add(key, version, None):
+                version = cache.get(key, version)
+        versions[name] = version
+    return versions
+
+
+def get_version(name):
+    return get_versions([name])[name]
+
+
+def bump_version(*names):
+    """Сбрасывает кэш, построенный на прежних версиях.
+
+    Новая версия выставляется после коммита, иначе параллельный запрос
+    успеет закэшировать ещё не изменённые данные под новой версией.
+    """
+    transaction.on_commit(partial(
+        cache.set_many,
+        {version_key(name): uuid4().hex for name in names},
+        None
+    ))
+
+
+def make_key(prefix, *parts):
+    return f'{prefix}:' + md5(
+        '|'.join(map(str, parts)).encode()
+    ).hexdigest()
+
+
+def get_or_build_many(items, build, timeout):
+    """Достаёт из кэша значения для items ({ключ: объект}).
+
+    Промахи строятся одним вызовом build(объекты) -> значения. Ключ строит
+    только процесс, взявший блокировку, остальные какое-то время ждут его
+    результата, чтобы популярная запись не строилась одновременно
+    несколькими запросами. Блокировка держится на cache.add(), который
+    атомарен в memcached и locmem; в файловом кэше она лишь уменьшает
+    число одновременных построений.
+    """
+    values = cache.get_many(items)
+    missing = {key: item for key, item in items.items() if key not in values}
+    if not missing:
+        return values
+    acquired = {
+        key: item for key, item in missing.items()
+        if cache.add(f'lock:{key}', 1, BUILD_LOCK_TIMEOUT)
+    }
+    try:
+        if acquired:
+            built = dict(zip(acquired, build(list(acquired.values()))))
+            cache.set_many(built, timeout)
+            values.update(built)
+    finally:
+        cache.delete_many([f'lock:{key}' for key in acquired])
+    waiting = {
+        key: item for key, item in missing.items() if key not in acquired
+    }
+    deadline = monotonic() + BUILD_WAIT_TIMEOUT
+    while waiting and monotonic() < deadline:
+        sleep(BUILD_POLL_INTERVAL)
+        for key, value in cache.get_many(waiting).items():
+            values[key] = value
+            del waiting[key]
+    if waiting:
+        values.update(zip(waiting, build(list(waiting.values()))))
+    return values
+
+
+def count_cache_event(name, event):
+    if not settings.RESPONSE_CACHE_STATS:
+        return
+    key = f'{RESPONSE_CACHE_STATS}:{name}:{event}'
+    cache.add(key, 0, None)
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, None)
+
+
+def response_cache_stats(name):
+    stats = cache.get_many([
+        f'{RESPONSE_CACHE_STATS}:{name}:hits',
+        f'{RESPONSE_CACHE_STATS}:{name}:misses',
+    ])
+    return {
+        event: stats.get(f'{RESPONSE_CACHE_STATS}:{name}:{event}', 0)
+        for event in ('hits', 'misses')
+    }
+
+
+class AnonymousListCacheMixin:
+    """Кэширует ответ list() для анонимных запросов.
+
+    Ответ анонимному пользователю не содержит персональных флагов, поэтому
+    его можно отдавать всем по ключу из нормализованных параметров запроса.
+    Запросы с параметрами вне cache_query_params не кэшируются.
+    """
+    cache_version_name = RECIPE_LIST
+    cache_query_params = (
+        'tags', 'author', 'page', 'limit', 'cursor', 'search', 'ordering',
+        'cooking_time_min', 'cooking_time_max', 'facets'
+    )
+    cache_timeout = settings.RECIPE_LIST_CACHE_TIMEOUT
+
+    def get_list_cache_key(self, request):
+        if (
+            request.method not in SAFE_METHODS
+            or request.user.is_authenticated
+            or set(request.query_params) - set(self.cache_query_params)
+        ):
+            return None
+        return make_key(
+            f'response:{self.cache_version_name}',
+            get_version(self.cache_version_name),
+            request.get_host(),
+            request.path,
+            *(
+                (param, sorted(request.query_params.getlist(param)))
+                for param in self.cache_query_params
+            )
+        )
+
+    def list(self, request, *args, **kwargs):
+        key = self.get_list_cache_key(request)
+        if key is None:
+            return super().list(request, *args, **kwargs)
+        data = cache.get(key)
+        if data is not None:
+            count_cache_event(self.cache_version_name, 'hits')
+            return Response(data, headers={'X-Cache': 'HIT'})
+        count_cache_event(self.cache_version_name, 'misses')
+        response = super().list(request, *args, **kwargs)
+        cache.set(key, response.data, self.cache_timeout)
+        response['X-Cache'] = 'MISS'
+        return response
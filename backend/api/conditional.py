@@ -0,0 +1,64 @@
+from threading import Lock
+
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+from api.cache import (
+    INGREDIENTS, TAGS, get_version, get_versions, make_key, recipe_version,
+    user_version, viewer_version
+)
+from recipes.models import Recipe
+
+_encoded_catalogues = {}
+_encoded_catalogues_lock = Lock()
+
+
+def version_etag(name):
+    """etag_func для condition(): ETag - версия каталога в кэше."""
+    def etag(request, *args, **kwargs):
+        return get_version(name)
+    return etag
+
+
+def catalogue_response(name, get_data):
+    """JSON каталога, закодированный один раз на версию и хранимый в
+    памяти процесса."""
+    version = get_version(name)
+    cached = _encoded_catalogues.get(name)
+    if cached is None or cached[0] != version:
+        with _encoded_catalogues_lock:
+            cached = _encoded_catalogues.get(name)
+            if cached is None or cached[0] != version:
+                cached = (version, JSONRenderer().render(get_data()))
+                _encoded_catalogues[name] = cached
+    return HttpResponse(cached[1], content_type='application/json')
+
+
+def get_recipe_state(request, pk):
+    if not hasattr(request, 'recipe_state'):
+        request.recipe_state = Recipe.objects.filter(pk=pk).values_list(
+            'author_id', 'updated_at', 'favorites_count'
+        ).first()
+    return request.recipe_state
+
+
+def recipe_etag(request, pk=None, **kwargs):
+    """ETag рецепта с учётом избранного, корзины и подписок зрителя.
+
+    Last-Modified не отдаётся: время изменения рецепта не меняется, когда
+    зритель добавляет его в избранное, и If-Modified-Since получал бы 304
+    с устаревшими флагами.
+    """
+    state = get_recipe_state(request, pk)
+    if state is None:
+        return None
+    author_id, updated_at, favorites_count = state
+    user = request.user
+    names = [recipe_version(pk), user_version(author_id), TAGS, INGREDIENTS]
+    if user.is_authenticated:
+        names.append(viewer_version(user.pk))
+    versions = get_versions(names)
+    return make_key(
+        'recipe', pk, updated_at.isoformat(), favorites_count, user.pk,
+        *(versions[name] for name in names)
+    )
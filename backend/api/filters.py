@@ -1,7 +1,10 @@
-from django_filters.rest_framework import BooleanFilter, FilterSet, CharFilter
+from django_filters.rest_framework import (
+    BooleanFilter, CharFilter, FilterSet, OrderingFilter, RangeFilter
+)
 from django.contrib.auth.models import AnonymousUser
 
-from recipes.models import Recipe, Ingredient
+from recipes.models import Recipe
+from recipes.search import search_recipes
 
 
 class RecipeFilter(FilterSet):
@@ -11,6 +14,17 @@ class RecipeFilter(FilterSet):
     is_favorited = BooleanFilter(
         method='filter_is_favorited',
     )
+    search = CharFilter(
+        method='filter_search',
+    )
+    cooking_time = RangeFilter()
+    ordering = OrderingFilter(
+        fields=(
+            ('created_at', 'created_at'),
+            ('favorites_count', 'popularity'),
+            ('shopping_carts_count', 'shopping_carts_count'),
+        )
+    )
 
     def filter_by_relation(self, queryset, name, value):
         return (
@@ -28,14 +42,12 @@ class RecipeFilter(FilterSet):
     def filter_is_favorited(self, queryset, name, value):
         return self.filter_by_relation(queryset, name, value)
 
-    class Meta:
-        model = Recipe
-        fields = ('is_in_shopping_cart', 'is_favorited')
-
-
-class IngredientFilter(FilterSet):
-    name = CharFilter(field_name='name', lookup_expr='icontains')
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
 
     class Meta:
-        model = Ingredient
-        fields = ('name',)
+        model = Recipe
+        fields = (
+            'is_in_shopping_cart', 'is_favorited', 'search', 'cooking_time',
+            'ordering'
+        )
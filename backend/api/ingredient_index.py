@@ -0,0 +1,94 @@
+from bisect import bisect_left, bisect_right
+from collections import namedtuple
+from threading import Lock
+
+from api.cache import INGREDIENTS, get_version
+from recipes.models import Ingredient
+
+
+# Неизменяемый снимок индекса: заменяется целиком одним присваиванием,
+# поэтому поиск без блокировки не видит наполовину перестроенный индекс.
+Snapshot = namedtuple(
+    'Snapshot',
+    ('version', 'items', 'names', 'sorted_items', 'joined_names', 'offsets')
+)
+EMPTY_SNAPSHOT = Snapshot(None, (), (), (), '', ())
+
+
+class IngredientIndex:
+    """Каталог продуктов в памяти процесса для автодополнения.
+
+    Названия хранятся в отсортированном массиве: совпадения по началу
+    названия находятся бинарным поиском, остальные - поиском по склеенной
+    строке всех названий.
+    Индекс перестраивается, когда меняется версия каталога в кэше.
+    """
+
+    def __init__(self):
+        self.lock = Lock()
+        self.snapshot = EMPTY_SNAPSHOT
+
+    def ensure_current(self):
+        """Снимок индекса для текущей версии каталога."""
+        version = get_version(INGREDIENTS)
+        snapshot = self.snapshot
+        if snapshot.version != version:
+            with self.lock:
+                snapshot = self.snapshot
+                if snapshot.version != version:
+                    snapshot = self.snapshot = self.build(version)
+        return snapshot
+
+    @staticmethod
+    def build(version):
+        items = [
+            {'id': id, 'name': name, 'measurement_unit': measurement_unit}
+            for id, name, measurement_unit in Ingredient.objects.order_by(
+                'id'
+            ).values_list('id', 'name', 'measurement_unit')
+        ]
+        entries = sorted(
+            ((item['name'].lower(), item['id']), item) for item in items
+        )
+        names = [key[0] for key, _ in entries]
+        offsets = []
+        offset = 0
+        for name in names:
+            offsets.append(offset)
+            offset += len(name) + 1
+        return Snapshot(
+            version, items, names, [item for _, item in entries],
+            '\n'.join(names), offsets
+        )
+
+    def search(self, query=''):
+        """Продукты, содержащие query: сначала начинающиеся с него,
+        затем со словом, начинающимся с него, затем все остальные."""
+        index = self.ensure_current()
+        query = query.strip().lower()
+        if not query:
+            return index.items
+        names, offsets = index.names, index.offsets
+        joined_names, sorted_items = index.joined_names, index.sorted_items
+        start = bisect_left(names, query)
+        end = start
+        while end < len(names) and names[end].startswith(query):
+            end += 1
+        word_matches = []
+        other_matches = []
+        found = joined_names.find(query)
+        while found != -1:
+            position = bisect_right(offsets, found) - 1
+            if not start <= position < end:
+                (
+                    word_matches
+                    if not joined_names[found - 1].isalnum()
+                    else other_matches
+                ).append(sorted_items[position])
+            if position + 1 == len(offsets):
+                break
+            found = joined_names.find(query, offsets[position + 1])
+        return sorted_items[start:end] + word_matches + other_matches
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,585 @@
+import asyncio
+import json
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import tracemalloc
+from base64 import b64encode
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+from statistics import median
+from time import perf_counter, sleep
+from wsgiref.util import setup_testing_defaults
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management.base import BaseCommand
+from django.db import reset_queries, transaction
+from django.db.models import Exists, F, OuterRef, Sum
+from django.http import Http404
+from django.test import RequestFactory
+from django.test.client import BOUNDARY, MULTIPART_CONTENT, encode_multipart
+from PIL import Image
+from rest_framework.parsers import JSONParser
+from rest_framework.request import Request
+
+from api.ingredient_index import IngredientIndex
+from api.parsers import ImageMultiPartParser
+from api.serializers import CurentUserSerializer
+from api.services import SHOPPING_LIST_FORMATS
+from foodgram_backend.asgi import AsyncReadsASGIHandler
+from recipes.models import (
+    Ingredient, Recipe, RecipeIngredient, ShoppingCart, ShoppingListItem,
+    Tag, User
+)
+from recipes.shortlinks import ShortLinkResolver, encode
+from recipes.transfer import RecipeImporter, export_recipes, read_records
+from recipes.views import redirect_to_recipe
+
+# Запуск воркера в отдельном процессе: время импорта приложения,
+# прогрева (при preload - в мастере до fork) и первых запросов в мс.
+STARTUP_PROBE = """
+import json, sys
+from time import perf_counter
+from wsgiref.util import setup_testing_defaults
+
+start = perf_counter()
+from foodgram_backend.wsgi import application
+timings = {'import': (perf_counter() - start) * 1000, 'warm_up': 0.0}
+if sys.argv[1] == 'preload':
+    start = perf_counter()
+    from api.warmup import warm_up
+    warm_up()
+    timings['warm_up'] = (perf_counter() - start) * 1000
+for path in sys.argv[2:]:
+    environ = {'PATH_INFO': path, 'HTTP_HOST': 'localhost'}
+    setup_testing_defaults(environ)
+    start = perf_counter()
+    b''.join(application(environ, lambda status, headers: None))
+    timings[path] = (perf_counter() - start) * 1000
+timings['PIL'] = 'PIL' in sys.modules
+print(json.dumps(timings))
+"""
+
+
+class Command(BaseCommand):
+    help = (
+        'Замеры производительности на синтетических данных. Все изменения '
+        'в базе откатываются по завершении.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenario', choices=sorted(
+            name[len('bench_'):] for name in dir(self)
+            if name.startswith('bench_')
+        ))
+        parser.add_argument(
+            '--recipes', type=int, nargs='+', default=[1000, 10000],
+            help='Размеры каталога рецептов для замеров.'
+        )
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, scenario, **options):
+        self.repeat = options['repeat']
+        random.seed(0)
+        with transaction.atomic():
+            getattr(self, f'bench_{scenario}')(**options)
+            transaction.set_rollback(True)
+
+    def measure(self, func):
+        """Медиана времени вызова func в миллисекундах."""
+        timings = []
+        for _ in range(self.repeat):
+            reset_queries()
+            start = perf_counter()
+            func()
+            timings.append((perf_counter() - start) * 1000)
+        return median(timings)
+
+    @staticmethod
+    def peak_memory(func):
+        """Пиковый объём памяти Python при вызове func в килобайтах."""
+        tracemalloc.start()
+        try:
+            func()
+            return tracemalloc.get_traced_memory()[1] / 1024
+        finally:
+            tracemalloc.stop()
+
+    def report(self, header, rows):
+        self.stdout.write(' | '.join(header))
+        for row in rows:
+            self.stdout.write(' | '.join(
+                f'{value:.2f}' if isinstance(value, float) else str(value)
+                for value in row
+            ))
+
+    def create_authors(self, count):
+        User.objects.bulk_create(
+            User(
+                email=f'bench{number}@example.com',
+                username=f'bench{number}',
+                first_name='Bench',
+                last_name='Bench',
+            )
+            for number in range(count)
+        )
+        return list(User.objects.filter(username__startswith='bench'))
+
+    def create_tags(self, count):
+        Tag.objects.bulk_create(
+            Tag(name=f'bench-tag-{number}', slug=f'bench-tag-{number}')
+            for number in range(count)
+        )
+        return list(Tag.objects.filter(slug__startswith='bench-tag-'))
+
+    def create_ingredients(self, count):
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'bench-ingredient-{number}',
+                       measurement_unit='г')
+            for number in range(count)
+        )
+        return list(
+            Ingredient.objects.filter(name__startswith='bench-ingredient-')
+        )
+
+    def create_recipes(self, count, authors, tags=(), ingredients=(),
+                       ingredients_per_recipe=5):
+        """Каталог рецептов с тэгами и продуктами через bulk_create."""
+        start = Recipe.objects.count()
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author=random.choice(authors),
+                    name=f'Bench recipe {start + number}',
+                    text='Синтетический рецепт для замеров.',
+                    cooking_time=random.randint(1, 240),
+                    image='recipes/bench.jpg',
+                )
+                for number in range(count)
+            ),
+            batch_size=1000
+        )
+        recipe_ids = list(
+            Recipe.objects.filter(name__startswith='Bench recipe ')
+            .order_by('-id').values_list('id', flat=True)[:count]
+        )
+        if tags:
+            Recipe.tags.through.objects.bulk_create(
+                (
+                    Recipe.tags.through(recipe_id=recipe_id, tag_id=tag.id)
+                    for recipe_id in recipe_ids
+                    for tag in random.sample(
+                        tags, random.randint(1, min(3, len(tags)))
+                    )
+                ),
+                batch_size=5000
+            )
+        if ingredients:
+            RecipeIngredient.objects.bulk_create(
+                (
+                    RecipeIngredient(
+                        recipe_id=recipe_id,
+                        ingredient=ingredient,
+                        amount=random.randint(1, 500)
+                    )
+                    for recipe_id in recipe_ids
+                    for ingredient in random.sample(
+                        ingredients, ingredients_per_recipe
+                    )
+                ),
+                batch_size=5000
+            )
+        return recipe_ids
+
+    def bench_tag_filter(self, **options):
+        """Фильтр по тэгам: JOIN + DISTINCT против полусоединения EXISTS."""
+        authors = self.create_authors(20)
+        tags = self.create_tags(8)
+        rows = []
+        created = 0
+        for size in sorted(options['recipes']):
+            self.create_recipes(size - created, authors, tags)
+            created = size
+            for selected in (1, 2, 4, 8):
+                slugs = [tag.slug for tag in tags[:selected]]
+                distinct = Recipe.objects.filter(
+                    tags__slug__in=slugs
+                ).distinct().order_by('-created_at')
+                semi_join = Recipe.objects.filter(Exists(
+                    Recipe.tags.through.objects.filter(
+                        recipe=OuterRef('pk'), tag__slug__in=slugs
+                    )
+                )).order_by('-created_at')
+                rows.append((
+                    size,
+                    selected,
+                    self.measure(lambda: list(distinct[:6])),
+                    self.measure(lambda: list(semi_join[:6])),
+                ))
+        self.report(
+            ('рецептов', 'тэгов', 'JOIN+DISTINCT, мс', 'EXISTS, мс'), rows
+        )
+
+    def bench_ingredient_search(self, **options):
+        """Автодополнение продуктов: icontains в базе против индекса."""
+        with open(
+            os.path.join(settings.BASE_DIR, 'data', 'ingredients.json'),
+            encoding='utf-8'
+        ) as file:
+            Ingredient.objects.bulk_create(
+                (Ingredient(**item) for item in json.load(file)),
+                ignore_conflicts=True
+            )
+        index = IngredientIndex()
+        index.ensure_current()
+        names = list(Ingredient.objects.values_list('name', flat=True))
+        rows = []
+        for length in (1, 2, 3, 5):
+            queries = [
+                name[:length] for name in random.sample(names, self.repeat)
+            ]
+            rows.append((
+                length,
+                self.measure(lambda: [
+                    list(Ingredient.objects.filter(
+                        name__icontains=query
+                    ).order_by('id').values('id', 'name', 'measurement_unit'))
+                    for query in queries
+                ]) / len(queries),
+                self.measure(
+                    lambda: [index.search(query) for query in queries]
+                ) / len(queries),
+            ))
+        self.report(
+            ('длина запроса', 'ORM icontains, мс', 'индекс, мс'), rows
+        )
+
+    def bench_shopping_list(self, **options):
+        """Список покупок: сумма по корзине в каждом запросе против
+        сохранённого списка, документ целиком в памяти против потока."""
+        authors = self.create_authors(20)
+        ingredients = self.create_ingredients(2000)
+        recipe_ids = self.create_recipes(
+            max(options['recipes']), authors, ingredients=ingredients,
+            ingredients_per_recipe=10
+        )
+        user = authors[0]
+        rows = []
+        cart_size = 0
+        for size in (100, 300, 1000):
+            ShoppingCart.objects.bulk_create(
+                ShoppingCart(user=user, recipe_id=recipe_id)
+                for recipe_id in recipe_ids[cart_size:size]
+            )
+            cart_size = size
+            ShoppingListItem.objects.rebuild([user.id])
+            joined = ShoppingCart.objects.filter(user=user).values(
+                ingredient_name=F(
+                    'recipe__recipeingredients__ingredient__name'
+                ),
+                ingredient_unit=F(
+                    'recipe__recipeingredients__ingredient__measurement_unit'
+                ),
+            ).annotate(
+                amount=Sum('recipe__recipeingredients__amount')
+            ).order_by('ingredient_name', 'ingredient_unit')
+            stored = user.shoppinglistitems.values(
+                'amount',
+                ingredient_name=F('ingredient__name'),
+                ingredient_unit=F('ingredient__measurement_unit'),
+            ).order_by('ingredient_name', 'ingredient_unit')
+            names = Recipe.objects.filter(
+                shoppingcarts__user=user
+            ).values_list('name', flat=True)
+            for format, generate in SHOPPING_LIST_FORMATS.items():
+                def buffered():
+                    return ''.join(
+                        generate(list(stored.all()), list(names.all()))
+                    )
+
+                def streamed(ingredients=stored):
+                    for _ in generate(
+                        ingredients.iterator(), names.iterator()
+                    ):
+                        pass
+
+                rows.append((
+                    size,
+                    format,
+                    self.measure(lambda: streamed(joined)),
+                    self.measure(streamed),
+                    self.peak_memory(buffered),
+                    self.peak_memory(streamed),
+                ))
+        self.report(
+            (
+                'рецептов в корзине', 'формат', 'JOIN + SUM, мс',
+                'сохранённый список, мс', 'строка, КБ', 'поток, КБ'
+            ),
+            rows
+        )
+
+    def bench_image_upload(self, **options):
+        """Загрузка изображения: base64 в теле JSON против multipart
+        с записью во временный файл."""
+        factory = RequestFactory()
+        rows = []
+        for side in (500, 1000, 1800):
+            image = BytesIO()
+            Image.effect_noise((side, side), 80).convert('RGB').save(
+                image, 'PNG'
+            )
+            content = image.getvalue()
+            encoded = json.dumps({'avatar': (
+                'data:image/png;base64,' + b64encode(content).decode()
+            )})
+
+            image.seek(0)
+            image.name = 'avatar.png'
+            multipart = encode_multipart(BOUNDARY, {'avatar': image})
+
+            def upload_base64():
+                self.validate_upload(factory.put(
+                    '/', encoded, content_type='application/json'
+                ))
+
+            def upload_multipart():
+                self.validate_upload(factory.put(
+                    '/', multipart, content_type=MULTIPART_CONTENT
+                ))
+
+            rows.append((
+                f'{len(content) / 1024 / 1024:.1f}',
+                self.measure(upload_base64),
+                self.measure(upload_multipart),
+                self.peak_memory(upload_base64),
+                self.peak_memory(upload_multipart),
+            ))
+        self.report(
+            (
+                'файл, МБ', 'base64, мс', 'multipart, мс', 'base64, КБ',
+                'multipart, КБ'
+            ),
+            rows
+        )
+
+    @staticmethod
+    def validate_upload(request):
+        request = Request(
+            request, parsers=(JSONParser(), ImageMultiPartParser())
+        )
+        serializer = CurentUserSerializer(data=request.data, partial=True)
+        serializer.is_valid(raise_exception=True)
+
+    def bench_recipe_transfer(self, **options):
+        """Выгрузка и загрузка рецептов в JSON Lines: рецептов в секунду.
+        Загружаются под новыми авторами, чтобы не совпасть с исходными."""
+        authors = self.create_authors(50)
+        tags = self.create_tags(8)
+        ingredients = self.create_ingredients(500)
+        rows = []
+        created = 0
+        for size in sorted(options['recipes']):
+            self.create_recipes(
+                size - created, authors, tags, ingredients,
+                ingredients_per_recipe=8
+            )
+            created = size
+            with tempfile.TemporaryFile('w+', encoding='utf-8') as file:
+                start = perf_counter()
+                export_recipes(file, queryset=Recipe.objects.filter(
+                    author__in=authors
+                ))
+                exported = perf_counter() - start
+                file.seek(0)
+                records = (
+                    {**record, 'author': {
+                        **record['author'],
+                        'email': f'{size}-{record["author"]["email"]}',
+                        'username': f'{size}-{record["author"]["username"]}',
+                    }}
+                    for record in read_records(file)
+                )
+                start = perf_counter()
+                imported = RecipeImporter().run(records)
+                elapsed = perf_counter() - start
+            rows.append((
+                size, exported, size / exported, elapsed, imported / elapsed
+            ))
+        self.report(
+            (
+                'рецептов', 'выгрузка, с', 'рецептов/с', 'загрузка, с',
+                'рецептов/с'
+            ),
+            rows
+        )
+
+    def bench_short_links(self, **options):
+        """Переходы по коротким ссылкам в секунду: запрос к базе на каждый
+        переход против LRU в памяти процесса."""
+        authors = self.create_authors(20)
+        recipe_ids = self.create_recipes(max(options['recipes']), authors)
+        missing_id = max(recipe_ids) + 1
+        clicks = 1000
+        rows = []
+        for case, ids in (
+            ('популярные', random.choices(recipe_ids[:100], k=clicks)),
+            ('случайные', random.choices(recipe_ids, k=clicks)),
+            ('несуществующие', [missing_id] * clicks),
+        ):
+            codes = [encode(recipe_id) for recipe_id in ids]
+            resolver = ShortLinkResolver()
+
+            def query():
+                for recipe_id in ids:
+                    try:
+                        redirect_to_recipe(
+                            recipe_id if Recipe.objects.filter(
+                                id=recipe_id
+                            ).exists() else None
+                        )
+                    except Http404:
+                        pass
+
+            def cached():
+                for code in codes:
+                    try:
+                        redirect_to_recipe(resolver.resolve(code))
+                    except Http404:
+                        pass
+
+            cached()
+            rows.append((
+                case,
+                clicks / self.measure(query) * 1000,
+                clicks / self.measure(cached) * 1000,
+            ))
+        self.report(('ссылки', 'запрос к базе, в с', 'LRU, в с'), rows)
+
+    @staticmethod
+    def serve_wsgi(handler, paths, delay):
+        """Синхронный воркер обслуживает клиентов по одному: пока ответ
+        уходит медленному клиенту, воркер ничего больше не делает."""
+        start = perf_counter()
+        for path in paths:
+            environ = {'PATH_INFO': path, 'HTTP_HOST': 'localhost'}
+            setup_testing_defaults(environ)
+            response = handler(environ, lambda status, headers: None)
+            for _ in response:
+                sleep(delay)
+            response.close()
+        return perf_counter() - start
+
+    @staticmethod
+    async def serve_asgi(application, paths, clients, delay):
+        """Цикл событий ведёт всех клиентов сразу: ожидание медленного
+        клиента не занимает поток."""
+        paths = iter(paths)
+
+        async def receive():
+            return {'type': 'http.request'}
+
+        async def send(message):
+            if message['type'] == 'http.response.body':
+                await asyncio.sleep(delay)
+
+        async def client():
+            for path in paths:
+                await application({
+                    'type': 'http',
+                    'asgi': {'version': '3.0'},
+                    'http_version': '1.1',
+                    'method': 'GET',
+                    'scheme': 'http',
+                    'path': path,
+                    'query_string': b'',
+                    'headers': [(b'host', b'localhost')],
+                    'client': ('127.0.0.1', 0),
+                    'server': ('localhost', 80),
+                }, receive, send)
+
+        start = perf_counter()
+        await asyncio.gather(*(client() for _ in range(clients)))
+        return perf_counter() - start
+
+    def bench_async_reads(self, **options):
+        """Запросы на чтение в секунду у одного воркера при одновременных
+        клиентах: синхронный воркер gunicorn (WSGI) против ASGI с пулом
+        потоков для ORM. Медленная сеть клиента имитируется задержкой
+        на каждый отправленный фрагмент ответа.
+
+        Обработчики работают со своими соединениями и не видят данных
+        транзакции замера, поэтому запросы идут к рецептам, уже
+        сохранённым в базе (например, загруженным import_recipes).
+        """
+        recipe_ids = list(
+            Recipe.objects.order_by('-id').values_list('id', flat=True)[:100]
+        )
+        if not recipe_ids:
+            self.stderr.write(
+                'В базе нет рецептов: замеряются только списки.'
+            )
+        paths = ['/api/recipes/', '/api/tags/', '/api/ingredients/']
+        for recipe_id in recipe_ids:
+            paths += [f'/api/recipes/{recipe_id}/', f'/s/{encode(recipe_id)}/']
+        wsgi, asgi = WSGIHandler(), AsyncReadsASGIHandler()
+        total = 300
+        rows = []
+        # Соединение этого потока занято транзакцией замера.
+        with ThreadPoolExecutor(1) as worker:
+            worker.submit(self.serve_wsgi, wsgi, paths, 0).result()
+            asyncio.run(self.serve_asgi(asgi, paths, 10, 0))
+            for delay in (0, 0.02):
+                for clients in (1, 10, 50):
+                    requests = random.choices(paths, k=total)
+                    rows.append((
+                        clients,
+                        delay * 1000,
+                        total / worker.submit(
+                            self.serve_wsgi, wsgi, requests, delay
+                        ).result(),
+                        total / asyncio.run(
+                            self.serve_asgi(asgi, requests, clients, delay)
+                        ),
+                    ))
+        self.report(
+            (
+                'клиентов', 'задержка клиента, мс', 'WSGI, запросов/с',
+                'ASGI, запросов/с'
+            ),
+            rows
+        )
+
+    def bench_startup(self, **options):
+        """Импорт приложения и первые запросы нового воркера: ленивая
+        загрузка против прогрева в мастере gunicorn (preload_app).
+        Каждый запуск - отдельный процесс, данные берутся из базы."""
+        paths = ['/api/tags/', '/api/ingredients/', '/api/recipes/']
+        rows = []
+        for mode in ('lazy', 'preload'):
+            runs = [
+                json.loads(subprocess.run(
+                    [sys.executable, '-c', STARTUP_PROBE, mode, *paths],
+                    cwd=settings.BASE_DIR, capture_output=True, text=True,
+                    check=True
+                ).stdout)
+                for _ in range(self.repeat)
+            ]
+            rows.append((
+                mode,
+                *(
+                    median(run[key] for run in runs)
+                    for key in ('import', 'warm_up', *paths)
+                ),
+                'да' if any(run['PIL'] for run in runs) else 'нет',
+            ))
+        self.report(
+            (
+                'режим', 'импорт, мс', 'прогрев, мс',
+                *(f'первый {path}, мс' for path in paths), 'Pillow загружен'
+            ),
+            rows
+        )
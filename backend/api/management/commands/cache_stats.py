@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from api.cache import RECIPE_LIST, response_cache_stats
+
+
+class Command(BaseCommand):
+    help = (
+        'Показывает попадания и промахи кэша ответов. Счётчики точные '
+        'с CACHE_BACKEND=memcached; с locmem они свои у каждого процесса, '
+        'с файловым кэшем (по умолчанию) выключены, если не задан '
+        'RESPONSE_CACHE_STATS=True.'
+    )
+
+    def handle(self, *args, **kwargs):
+        if not settings.RESPONSE_CACHE_STATS:
+            self.stderr.write(
+                'Счётчики выключены: RESPONSE_CACHE_STATS=False.'
+            )
+        for name in (RECIPE_LIST,):
+            stats = response_cache_stats(name)
+            total = stats['hits'] + stats['misses']
+            self.stdout.write(
+                f'{name}: попаданий {stats["hits"]}, промахов '
+                f'{stats["misses"]}, доля попаданий '
+                f'{stats["hits"] / total if total else 0:.1%}'
+            )
@@ -1,7 +1,223 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+from datetime import datetime
+from functools import reduce
+from operator import and_, or_
+
 from django.conf import settings
-from rest_framework.pagination import PageNumberPagination
+from django.core.cache import cache
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from api.cache import PAGINATION_COUNTS, get_version, make_key
+from recipes.paginator import EstimatedCountPaginator
+
+
+class CursorJSONEncoder(DjangoJSONEncoder):
+    """Сохраняет микросекунды, которые DjangoJSONEncoder отбрасывает."""
+
+    def default(self, o):
+        if isinstance(o, datetime):
+            return o.isoformat()
+        return super().default(o)
+
+
+class KeysetPagination(BasePagination):
+    """Постраничный вывод по курсору без COUNT и OFFSET.
+
+    Порядок берётся из queryset (или Meta.ordering модели) и дополняется
+    первичным ключом, чтобы позиция в выдаче была однозначной.
+    """
+    page_size = settings.PAGINATION_PAGE_SIZE
+    page_size_query_param = 'limit'
+    max_page_size = settings.PAGINATION_MAX_PAGE_SIZE
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Неверный курсор.'
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return (
+            min(page_size, self.max_page_size) if page_size > 0
+            else self.page_size
+        )
+
+    def get_ordering(self, queryset):
+        query = queryset.query
+        ordering = [
+            field for field in (
+                query.order_by or (
+                    query.get_meta().ordering if query.default_ordering
+                    else ()
+                )
+            )
+            if isinstance(field, str) and '__' not in field
+        ]
+        pk_name = queryset.model._meta.pk.name
+        if not any(
+            field.lstrip('-') in ('pk', pk_name) for field in ordering
+        ):
+            descending = bool(ordering) and ordering[0].startswith('-')
+            ordering.append(f'-{pk_name}' if descending else pk_name)
+        return [
+            (
+                pk_name if field.lstrip('-') == 'pk' else field.lstrip('-'),
+                field.startswith('-')
+            )
+            for field in ordering
+        ]
+
+    def encode_cursor(self, instance, reverse):
+        position = [getattr(instance, name) for name, _ in self.ordering]
+        cursor = json.dumps(
+            {'p': position, 'r': int(reverse)}, cls=CursorJSONEncoder
+        )
+        return replace_query_param(
+            self.base_url,
+            self.cursor_query_param,
+            urlsafe_b64encode(cursor.encode()).decode()
+        )
+
+    def decode_cursor(self, request, queryset):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None, False
+        try:
+            cursor = json.loads(urlsafe_b64decode(encoded.encode()))
+            position = cursor['p']
+            if len(position) != len(self.ordering):
+                raise ValueError
+            return [
+                self.to_python(queryset, name, value)
+                for (name, _), value in zip(self.ordering, position)
+            ], bool(cursor['r'])
+        except (TypeError, ValueError, KeyError, ValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    @staticmethod
+    def to_python(queryset, name, value):
+        """Значение курсора в типе поля или аннотации (например, ранга
+        поиска); ошибка преобразования - ValidationError."""
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field.to_python(value)
+        try:
+            return queryset.model._meta.get_field(name).to_python(value)
+        except FieldDoesNotExist:
+            return value
+
+    def position_filter(self, position, reverse):
+        conditions = []
+        for index, (name, descending) in enumerate(self.ordering):
+            lookup = 'lt' if descending != reverse else 'gt'
+            conditions.append(reduce(and_, (
+                *(
+                    Q(**{previous: value})
+                    for (previous, _), value in zip(
+                        self.ordering[:index], position
+                    )
+                ),
+                Q(**{f'{name}__{lookup}': position[index]}),
+            )))
+        return reduce(or_, conditions)
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        self.base_url = request.build_absolute_uri()
+        self.ordering = self.get_ordering(queryset)
+        position, reverse = self.decode_cursor(request, queryset)
+        queryset = queryset.order_by(*(
+            f'-{name}' if descending != reverse else name
+            for name, descending in self.ordering
+        ))
+        if position is not None:
+            queryset = queryset.filter(self.position_filter(position, reverse))
+        page = list(queryset[:self.page_size + 1])
+        has_more = len(page) > self.page_size
+        del page[self.page_size:]
+        if reverse:
+            page.reverse()
+        self.has_next = has_more or reverse
+        self.has_previous = has_more if reverse else position is not None
+        self.page = page
+        return page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
 
 
 class LimitPagePagination(PageNumberPagination):
+    """Номера страниц по умолчанию, курсор - если передан ?cursor=."""
     page_size = settings.PAGINATION_PAGE_SIZE
     page_size_query_param = 'limit'
+    keyset_pagination_class = KeysetPagination
+    keyset_pagination = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.keyset_pagination_class.cursor_query_param in (
+            request.query_params
+        ):
+            self.keyset_pagination = self.keyset_pagination_class()
+            return self.keyset_pagination.paginate_queryset(
+                queryset, request, view
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset_pagination is not None:
+            return self.keyset_pagination.get_paginated_response(data)
+        return super().get_paginated_response(data)
+
+
+class CachedCountPaginator(EstimatedCountPaginator):
+    """Кэширует точное количество объектов для одинаковых фильтров."""
+
+    def get_exact_count(self):
+        query = self.object_list.order_by().values('pk').query
+        sql, params = query.sql_with_params()
+        key = make_key('count', get_version(PAGINATION_COUNTS), sql, params)
+        count = cache.get(key)
+        if count is None:
+            count = super().get_exact_count()
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TIMEOUT)
+        return count
+
+
+class CachedCountPagination(LimitPagePagination):
+    django_paginator_class = CachedCountPaginator
+
+    def get_paginated_response(self, data):
+        if self.keyset_pagination is not None:
+            return self.keyset_pagination.get_paginated_response(data)
+        paginator = self.page.paginator
+        return Response(OrderedDict([
+            ('count', paginator.count),
+            ('count_exact', paginator.count_exact),
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data)
+        ]))
@@ -0,0 +1,56 @@
+import json
+
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import DataAndFiles, MultiPartParser
+
+from api.uploadhandlers import ImageUploadHandler
+
+
+class ImageMultiPartParser(MultiPartParser):
+    """multipart/form-data, файлы которого принимает ImageUploadHandler.
+
+    Обработчик ставится только на запросы API, остальные представления
+    (например, админка) работают с обработчиками Django по умолчанию.
+    """
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        request = parser_context['request']
+        request.upload_handlers = [ImageUploadHandler(request._request)]
+        return super().parse(stream, media_type, parser_context)
+
+
+class MultiPartJSONParser(ImageMultiPartParser):
+    """multipart/form-data, в котором вложенные поля (ingredients, tags)
+    переданы строками JSON, а изображение - файлом.
+
+    Поля списков всегда становятся списком: значение может быть
+    массивом JSON или повторяться (tags=1&tags=2), в том числе один раз.
+    """
+    list_fields = ('ingredients', 'tags')
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parsed = super().parse(stream, media_type, parser_context)
+        data = {}
+        for key, values in parsed.data.lists():
+            # Остальные поля - обычный текст, даже если похожи на JSON.
+            if key not in self.list_fields:
+                data[key] = values[-1]
+                continue
+            data[key] = []
+            for value in map(self.decode, values):
+                if isinstance(value, list):
+                    data[key].extend(value)
+                else:
+                    data[key].append(value)
+        # request.data дополняется файлами через dict.update, которому
+        # MultiValueDict отдаёт списки, поэтому файлы - обычным словарём.
+        return DataAndFiles(data, parsed.files.dict())
+
+    @staticmethod
+    def decode(value):
+        if not value.lstrip().startswith(('[', '{')):
+            return value
+        try:
+            return json.loads(value)
+        except ValueError as error:
+            raise ParseError(f'Некорректный JSON: {error}')
@@ -1,18 +1,106 @@
 
-from collections import Counter
+from collections import Counter, defaultdict
 
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import transaction
+from django.db.models import (
+    Exists, F, Manager, OuterRef, Prefetch, Window
+)
+from django.db.models.functions import RowNumber
+from django.db.models import prefetch_related_objects
 from djoser.serializers import UserSerializer
-from drf_extra_fields.fields import Base64ImageField
+from drf_extra_fields.fields import HybridImageField
 from rest_framework import serializers
+from rest_framework.relations import MANY_RELATION_KWARGS
 
+from api.cache import (
+    INGREDIENTS, TAGS, get_or_build_many, get_versions, make_key,
+    recipe_version, user_version
+)
+from recipes.bulk import bulk_create_recipes
+from recipes.catalogue import Upsert
+from recipes.images import rendition_urls
 from recipes.models import (
     Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
-    Subscription, Tag, User
+    ShoppingListItem, Subscription, Tag, User
 )
 
 
+def get_related_objects(context, queryset, ids):
+    """{id: объект} для найденных в queryset ids.
+
+    Все id, которых ещё нет в context['related_objects'], загружаются
+    одним запросом IN. RecipeListSerializer заполняет этот словарь сразу
+    для всех рецептов списка.
+    """
+    known = context.setdefault('related_objects', {}).setdefault(
+        queryset.model, {}
+    )
+    missing = set(ids) - known.keys()
+    if missing:
+        known.update(dict.fromkeys(missing))
+        known.update(queryset.in_bulk(missing))
+    return {id: known[id] for id in ids if known.get(id) is not None}
+
+
+class BulkManyRelatedField(serializers.ManyRelatedField):
+    """Список первичных ключей, который проверяется одним запросом."""
+
+    def to_internal_value(self, data):
+        if isinstance(data, str) or not hasattr(data, '__iter__'):
+            self.fail('not_a_list', input_type=type(data).__name__)
+        if not self.allow_empty and len(data) == 0:
+            self.fail('empty')
+        relation = self.child_relation
+        ids = []
+        for pk in data:
+            if isinstance(pk, bool):
+                relation.fail('incorrect_type', data_type=type(pk).__name__)
+            try:
+                ids.append(int(pk))
+            except (TypeError, ValueError):
+                relation.fail('incorrect_type', data_type=type(pk).__name__)
+        found = get_related_objects(
+            self.context, relation.get_queryset(), ids
+        )
+        not_found = [pk for pk in ids if pk not in found]
+        if not_found:
+            relation.fail('does_not_exist', pk_value=not_found)
+        return [found[pk] for pk in ids]
+
+
+class BulkPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+
+    @classmethod
+    def many_init(cls, *args, **kwargs):
+        list_kwargs = {'child_relation': cls(*args, **kwargs)}
+        for key in kwargs:
+            if key in MANY_RELATION_KWARGS:
+                list_kwargs[key] = kwargs[key]
+        return BulkManyRelatedField(**list_kwargs)
+
+
+class ImageRenditionsField(serializers.ReadOnlyField):
+    """Ссылки на уменьшенные копии изображения по размерам и форматам.
+
+    Ещё не созданная копия отдаётся как null: клиент показывает image.
+    """
+
+    def to_representation(self, field_file):
+        urls = rendition_urls(field_file)
+        request = self.context.get('request')
+        if urls is None or request is None:
+            return urls
+        return {
+            rendition: {
+                format: url and request.build_absolute_uri(url)
+                for format, url in formats.items()
+            }
+            for rendition, formats in urls.items()
+        }
+
+
 class TagSerializer(serializers.ModelSerializer):
 
     class Meta:
@@ -41,16 +129,21 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
 
 class CurentUserSerializer(UserSerializer):
     is_subscribed = serializers.SerializerMethodField()
-    avatar = Base64ImageField()
+    avatar = HybridImageField()
+    avatar_renditions = ImageRenditionsField(source='avatar')
 
     class Meta(UserSerializer.Meta):
         abstract = True
         model = User
         fields = (
-            *UserSerializer.Meta.fields, 'is_subscribed', 'avatar'
+            *UserSerializer.Meta.fields, 'is_subscribed', 'avatar',
+            'avatar_renditions'
         )
 
     def get_is_subscribed(self, author):
+        annotated = getattr(author, 'is_subscribed', None)
+        if annotated is not None:
+            return annotated
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return Subscription.objects.filter(
@@ -65,8 +158,43 @@ class CurentUserSerializer(UserSerializer):
         return super().validate(attrs)
 
 
+class RecipeListSerializer(serializers.ListSerializer):
+
+    def to_internal_value(self, data):
+        if isinstance(data, list):
+            self.load_related_objects(data)
+        return super().to_internal_value(data)
+
+    def load_related_objects(self, data):
+        """Тэги и продукты всех рецептов списка - по запросу на модель."""
+        items = [item for item in data if isinstance(item, dict)]
+        for queryset, ids in (
+            (Tag.objects.all(), (
+                pk for item in items for pk in item.get('tags') or ()
+            )),
+            (Ingredient.objects.all(), (
+                ingredient.get('id') for item in items
+                for ingredient in item.get('ingredients') or ()
+                if isinstance(ingredient, dict)
+            )),
+        ):
+            get_related_objects(
+                self.context, queryset, {
+                    pk for pk in ids
+                    if isinstance(pk, int) and not isinstance(pk, bool)
+                }
+            )
+
+    def create(self, validated_data):
+        return self.child.bulk_create(validated_data)
+
+    def to_representation(self, data):
+        recipes = data.all() if isinstance(data, Manager) else data
+        return self.child.represent_many(list(recipes))
+
+
 class RecipeSerializer(serializers.ModelSerializer):
-    tags = serializers.PrimaryKeyRelatedField(
+    tags = BulkPrimaryKeyRelatedField(
         many=True,
         queryset=Tag.objects.all(),
         required=True
@@ -79,7 +207,9 @@ class RecipeSerializer(serializers.ModelSerializer):
     )
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
-    image = Base64ImageField()
+    favorites_count = serializers.IntegerField(read_only=True)
+    image = HybridImageField()
+    image_renditions = ImageRenditionsField(source='image')
 
     class Meta:
         model = Recipe
@@ -90,31 +220,33 @@ class RecipeSerializer(serializers.ModelSerializer):
             'ingredients',
             'is_favorited',
             'is_in_shopping_cart',
+            'favorites_count',
             'name',
             'image',
+            'image_renditions',
             'text',
             'cooking_time',
         )
+        list_serializer_class = RecipeListSerializer
 
     def related_field_validate(
         self, model_data, field_name, model, validation_message
     ):
         if not model_data:
             raise ValidationError(validation_message)
-        id_set = set(
-            item.id if model == Tag or isinstance(item, Tag)
+        ids = [
+            item.id if isinstance(item, model)
             else item['ingredient']['id'] for item in model_data
-        )
-        not_found = [
-            id for id in id_set if not model.objects.filter(id=id).exists()
         ]
-        duplicates = [id for id, count in Counter(id_set).items() if count > 1]
+        found = get_related_objects(self.context, model.objects.all(), ids)
+        not_found = sorted({id for id in ids if id not in found})
+        duplicates = [id for id, count in Counter(ids).items() if count > 1]
         errors = []
         if not_found:
-            errors.append(f'{field_name}s с ID {not_found} не найдены.')
+            errors.append(f'{field_name} с ID {not_found} не найдены.')
         if duplicates:
             errors.append(
-                f'Обнаружены дублированные {field_name}s с ID: {duplicates}.'
+                f'Обнаружены дублированные {field_name} с ID: {duplicates}.'
             )
         if errors:
             raise ValidationError(errors)
@@ -157,42 +289,199 @@ class RecipeSerializer(serializers.ModelSerializer):
         recipe.tags.set(tags_data)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients_data):
+        """Меняет только разницу между сохранёнными и переданными
+        продуктами: удаляет лишние, остальные - одним upsert."""
+        current = dict(
+            recipe.recipeingredients.values_list('ingredient_id', 'amount')
+        )
+        submitted = {
+            item['ingredient']['id']: item['amount']
+            for item in ingredients_data
+        }
+        removed = current.keys() - submitted.keys()
+        changed = {
+            id: amount for id, amount in submitted.items()
+            if current.get(id) != amount
+        }
+        if removed:
+            recipe.recipeingredients.filter(ingredient_id__in=removed).delete()
+        if changed:
+            Upsert(
+                RecipeIngredient, ('recipe', 'ingredient'), ('amount',),
+                copy=False
+            )(
+                {'recipe': recipe.id, 'ingredient': id, 'amount': amount}
+                for id, amount in changed.items()
+            )
+        ShoppingListItem.objects.change_ingredients(recipe.id, {
+            id: submitted.get(id, 0) - current.get(id, 0)
+            for id in removed | changed.keys()
+        })
+
     @transaction.atomic
     def update(self, instance, validated_data):
         tags_data = validated_data.pop('tags', None)
         ingredients_data = validated_data.pop('recipeingredients', None)
-        self.validate_ingredients(ingredients_data)
-        self.validate_tags(tags_data)
-        instance.tags.set(tags_data)
-        instance.recipeingredients.all().delete()
-        self.recipe_ingredients_create(instance, ingredients_data)
+        if tags_data is not None:
+            # set() сам сравнивает с текущими тэгами и пишет только разницу.
+            instance.tags.set(tags_data)
+        if ingredients_data is not None:
+            self.update_ingredients(instance, ingredients_data)
         return super().update(instance, validated_data)
 
+    @transaction.atomic
+    def bulk_create(self, validated_data):
+        recipes = bulk_create_recipes([
+            (
+                Recipe(**{
+                    field: value for field, value in data.items()
+                    if field not in ('tags', 'recipeingredients')
+                }),
+                [tag.id for tag in data['tags']],
+                {
+                    item['ingredient']['id']: item['amount']
+                    for item in data['recipeingredients']
+                },
+            )
+            for data in validated_data
+        ])
+        for recipe in recipes:
+            # Новый рецепт ещё ни у кого не в избранном и не в корзине,
+            # а на себя автор подписаться не может.
+            recipe.is_favorited = recipe.is_in_shopping_cart = False
+            recipe.is_author_subscribed = recipe.author.is_subscribed = False
+        return recipes
+
     def to_representation(self, instance):
-        return {
-            **super().to_representation(instance),
-            'tags': TagSerializer(instance.tags.all(), many=True).data
+        return self.represent_many([instance])[0]
+
+    def represent_many(self, recipes):
+        """Сериализует рецепты через кэш общих для всех частей.
+
+        В кэше лежит представление рецепта без флагов текущего пользователя,
+        ключ меняется при изменении рецепта, его автора, тэгов и продуктов.
+        """
+        request = self.context.get('request')
+        host = request.get_host() if request else None
+        versions = get_versions({
+            TAGS, INGREDIENTS,
+            *(recipe_version(recipe.pk) for recipe in recipes),
+            *(user_version(recipe.author_id) for recipe in recipes),
+        })
+        keys = {
+            make_key(
+                'recipe-fragment',
+                recipe.pk,
+                host,
+                versions[recipe_version(recipe.pk)],
+                versions[user_version(recipe.author_id)],
+                versions[TAGS],
+                versions[INGREDIENTS],
+            ): recipe
+            for recipe in recipes
         }
+        fragments = get_or_build_many(
+            keys, self.build_fragments,
+            settings.RECIPE_FRAGMENT_CACHE_TIMEOUT
+        )
+        return [
+            self.add_viewer_flags(recipe, fragments[key])
+            for key, recipe in keys.items()
+        ]
 
-    def check_relation(self, recipe, model):
+    def build_fragments(self, recipes):
         request = self.context.get('request')
+        author_queryset = User.objects.all()
+        if request and request.user.is_authenticated:
+            author_queryset = author_queryset.annotate(
+                is_subscribed=Exists(Subscription.objects.filter(
+                    user=request.user, author=OuterRef('pk')
+                ))
+            )
+        prefetch_related_objects(
+            recipes,
+            'tags',
+            Prefetch(
+                'recipeingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+            Prefetch('author', queryset=author_queryset),
+        )
+        return [
+            {
+                **super(RecipeSerializer, self).to_representation(recipe),
+                'tags': TagSerializer(recipe.tags.all(), many=True).data
+            }
+            for recipe in recipes
+        ]
+
+    def add_viewer_flags(self, recipe, fragment):
+        return {
+            **fragment,
+            'author': {
+                **fragment['author'],
+                'is_subscribed': self.get_author_subscribed(recipe),
+            },
+            'is_favorited': self.get_is_favorited(recipe),
+            'is_in_shopping_cart': self.get_is_in_shopping_cart(recipe),
+            'favorites_count': recipe.favorites_count,
+        }
+
+    def get_viewer(self):
+        """Текущий пользователь или None для анонима и вызова без запроса."""
+        user = getattr(self.context.get('request'), 'user', None)
+        return user if user is not None and user.is_authenticated else None
+
+    def get_author_subscribed(self, recipe):
+        annotated = getattr(recipe, 'is_author_subscribed', None)
+        if annotated is not None:
+            return annotated
+        viewer = self.get_viewer()
+        if viewer is None:
+            return False
+        # Подписки зрителя загружаются одним запросом на весь ответ.
+        if 'subscribed_author_ids' not in self.context:
+            self.context['subscribed_author_ids'] = set(
+                Subscription.objects.filter(user=viewer).values_list(
+                    'author_id', flat=True
+                )
+            )
+        return recipe.author_id in self.context['subscribed_author_ids']
+
+    def check_relation(self, recipe, model, annotation):
+        annotated = getattr(recipe, annotation, None)
+        if annotated is not None:
+            return annotated
+        viewer = self.get_viewer()
         return (
-            request.user.is_authenticated
-            and model.objects.filter(user=request.user, recipe=recipe).exists()
+            viewer is not None
+            and model.objects.filter(user=viewer, recipe=recipe).exists()
         )
 
     def get_is_favorited(self, recipe):
-        return self.check_relation(recipe, Favorite)
+        return self.check_relation(recipe, Favorite, 'is_favorited')
 
     def get_is_in_shopping_cart(self, recipe):
-        return self.check_relation(recipe, ShoppingCart)
+        return self.check_relation(
+            recipe, ShoppingCart, 'is_in_shopping_cart'
+        )
 
 
 class RecipeMiniSerializer(serializers.ModelSerializer):
+    image_renditions = ImageRenditionsField(source='image')
 
     class Meta:
         model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+        fields = ('id', 'name', 'image', 'image_renditions', 'cooking_time')
+
+
+class SubscriptionListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        authors = list(data.all() if isinstance(data, Manager) else data)
+        self.child.prefetch_recipes(authors)
+        return super().to_representation(authors)
 
 
 class SubscriptionSerializer(CurentUserSerializer):
@@ -203,14 +492,41 @@ class SubscriptionSerializer(CurentUserSerializer):
         fields = (
             *CurentUserSerializer.Meta.fields, 'recipes_count', 'recipes'
         )
+        list_serializer_class = SubscriptionListSerializer
+
+    def to_representation(self, author):
+        if not hasattr(author, 'latest_recipes'):
+            self.prefetch_recipes([author])
+        return super().to_representation(author)
+
+    def prefetch_recipes(self, authors):
+        """Последние recipes_limit рецептов всех авторов одним запросом:
+        ROW_NUMBER() с разбиением по автору и отбор по номеру строки."""
+        limit = self.context.get('recipes_limit')
+        recipes = Recipe.objects.filter(
+            author__in=authors
+        ).only('id', 'name', 'image', 'cooking_time', 'author_id')
+        if limit is None:
+            recipes = recipes.order_by('-created_at', '-id')
+        else:
+            sql, params = recipes.annotate(recipe_rank=Window(
+                RowNumber(),
+                partition_by=F('author_id'),
+                order_by=(F('created_at').desc(), F('id').desc())
+            )).order_by().query.sql_with_params()
+            recipes = Recipe.objects.raw(
+                f'SELECT * FROM ({sql}) ranked WHERE recipe_rank <= %s '
+                f'ORDER BY recipe_rank',
+                (*params, limit)
+            )
+        latest_recipes = defaultdict(list)
+        for recipe in recipes:
+            latest_recipes[recipe.author_id].append(recipe)
+        for author in authors:
+            author.latest_recipes = latest_recipes[author.id]
 
     def get_recipes(self, user):
-        return RecipeMiniSerializer(
-            user.recipes.all()[
-                :self.context.get('recipes_limit', 10**10)
-            ],
-            many=True
-        ).data
+        return RecipeMiniSerializer(user.latest_recipes, many=True).data
 
     def get_recipes_count(self, user):
-        return user.recipes.count()
+        return user.recipes_count
@@ -1,21 +1,62 @@
+import csv
 import datetime
+import json
 
 
-def shopping_cart_list(ingredients, cart_recipes):
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+def shopping_list_txt(ingredients, recipe_names):
     today = datetime.datetime.now().strftime('%d-%m-%Y')
-    ingredients_info = [
-        f'{i}. {ingredient["ingredient_name"].capitalize()} - '
-        f'{ingredient["total_amount"]}'
-        f'({ingredient["ingredient_unit"]})'
-
-        for i, ingredient in enumerate(ingredients, start=1)
-    ]
-    recipe_names = [f'- {recipe.name}' for recipe in cart_recipes]
-    shopping_list = '\n'.join([
-        f'Дата составления списка покупок: {today}',
-        'Для приготовления следующих рецептов:',
-        *recipe_names,
-        'Вам потребуется купить продуктов:',
-        *ingredients_info
-    ])
-    return shopping_list
+    yield f'Дата составления списка покупок: {today}\n'
+    yield 'Для приготовления следующих рецептов:\n'
+    for name in recipe_names:
+        yield f'- {name}\n'
+    yield 'Вам потребуется купить продуктов:\n'
+    for i, ingredient in enumerate(ingredients, start=1):
+        yield (
+            f'{i}. {ingredient["ingredient_name"].capitalize()} - '
+            f'{ingredient["amount"]}'
+            f'({ingredient["ingredient_unit"]})\n'
+        )
+
+
+def shopping_list_csv(ingredients, recipe_names):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('Продукт', 'Количество', 'Единица измерения'))
+    for ingredient in ingredients:
+        yield writer.writerow((
+            ingredient['ingredient_name'],
+            ingredient['amount'],
+            ingredient['ingredient_unit'],
+        ))
+
+
+def shopping_list_json(ingredients, recipe_names):
+    yield '{"date": %s, "recipes": [' % json.dumps(
+        datetime.date.today().isoformat()
+    )
+    for i, name in enumerate(recipe_names):
+        yield (', ' if i else '') + json.dumps(name, ensure_ascii=False)
+    yield '], "ingredients": ['
+    for i, ingredient in enumerate(ingredients):
+        yield (', ' if i else '') + json.dumps(
+            {
+                'name': ingredient['ingredient_name'],
+                'amount': ingredient['amount'],
+                'measurement_unit': ingredient['ingredient_unit'],
+            },
+            ensure_ascii=False
+        )
+    yield ']}'
+
+
+SHOPPING_LIST_FORMATS = {
+    'txt': shopping_list_txt,
+    'csv': shopping_list_csv,
+    'json': shopping_list_json,
+}
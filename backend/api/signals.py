@@ -0,0 +1,93 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from api.cache import (
+    INGREDIENTS, PAGINATION_COUNTS, RECIPE_LIST, SHORT_LINKS, TAGS,
+    bump_version, recipe_version, user_version, viewer_version
+)
+from recipes.catalogue import catalogue_imported
+from recipes.models import (
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    Subscription, Tag, User
+)
+
+# Поля автора, которые попадают в выдачу рецептов.
+USER_PROFILE_FIELDS = {
+    'email', 'username', 'first_name', 'last_name', 'avatar'
+}
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def recipe_changed(instance, action='post', reverse=False, pk_set=None,
+                   **kwargs):
+    if not action.startswith('post'):
+        return
+    recipe_ids = (pk_set or ()) if reverse else (instance.pk,)
+    bump_version(
+        PAGINATION_COUNTS, RECIPE_LIST, *map(recipe_version, recipe_ids)
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_created_or_deleted(instance, created=True, **kwargs):
+    """Короткие ссылки кэшируются в каждом воркере, сигнал о новом
+    или удалённом рецепте доходит до всех только через версию."""
+    if created:
+        bump_version(SHORT_LINKS)
+
+
+@receiver(catalogue_imported, sender=Recipe)
+def recipes_imported(**kwargs):
+    bump_version(PAGINATION_COUNTS, RECIPE_LIST, SHORT_LINKS)
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredients_changed(instance, **kwargs):
+    bump_version(RECIPE_LIST, recipe_version(instance.recipe_id))
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+@receiver(catalogue_imported, sender=Ingredient)
+def ingredient_changed(**kwargs):
+    bump_version(RECIPE_LIST, INGREDIENTS)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+@receiver(catalogue_imported, sender=Tag)
+def tag_changed(**kwargs):
+    bump_version(RECIPE_LIST, TAGS)
+
+
+@receiver(post_save, sender=User)
+def user_profile_changed(instance, update_fields=None, **kwargs):
+    if update_fields is None or USER_PROFILE_FIELDS & set(update_fields):
+        bump_version(RECIPE_LIST, user_version(instance.pk))
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+@receiver(post_delete, sender=User)
+def relation_changed(instance, created=True, **kwargs):
+    if not created:
+        return
+    if isinstance(instance, User):
+        bump_version(PAGINATION_COUNTS)
+    elif isinstance(instance, Favorite):
+        # favorites_count входит в выдачу рецептов и порядок по популярности.
+        bump_version(
+            PAGINATION_COUNTS, RECIPE_LIST, viewer_version(instance.user_id),
+            recipe_version(instance.recipe_id)
+        )
+    else:
+        bump_version(PAGINATION_COUNTS, viewer_version(instance.user_id))
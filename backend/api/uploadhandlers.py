@@ -0,0 +1,50 @@
+from django.conf import settings
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.template.defaultfilters import filesizeformat
+from rest_framework.exceptions import ValidationError
+
+# Сигнатуры в начале файла для допустимых форматов изображений.
+IMAGE_SIGNATURES = (
+    (0, b'\xff\xd8\xff'),
+    (0, b'\x89PNG\r\n\x1a\n'),
+    (0, b'GIF87a'),
+    (0, b'GIF89a'),
+    (8, b'WEBP'),
+)
+SIGNATURE_LENGTH = 12
+
+
+class ImageUploadHandler(TemporaryFileUploadHandler):
+    """Пишет загружаемый файл во временный файл по частям, проверяя
+    формат по первым байтам и размер по мере получения данных."""
+    max_size = settings.MAX_IMAGE_UPLOAD_SIZE
+
+    def new_file(self, field_name, *args, **kwargs):
+        super().new_file(field_name, *args, **kwargs)
+        self.size = 0
+        self.head = b''
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > self.max_size:
+            self.reject(f'Файл больше {filesizeformat(self.max_size)}.')
+        if len(self.head) < SIGNATURE_LENGTH:
+            self.head += raw_data[:SIGNATURE_LENGTH - len(self.head)]
+            if len(self.head) >= SIGNATURE_LENGTH and not self.is_image():
+                self.reject('Загруженный файл не является изображением.')
+        return super().receive_data_chunk(raw_data, start)
+
+    def file_complete(self, file_size):
+        if not self.is_image():
+            self.reject('Загруженный файл не является изображением.')
+        return super().file_complete(file_size)
+
+    def is_image(self):
+        return any(
+            self.head[offset:offset + len(signature)] == signature
+            for offset, signature in IMAGE_SIGNATURES
+        )
+
+    def reject(self, message):
+        self.file.close()
+        raise ValidationError({self.field_name: [message]})
@@ -1,26 +1,39 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Exists, F, OuterRef, Sum
-from django.http import FileResponse
+from django.db.models import BooleanField, Exists, F, OuterRef, Value
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
 from django_filters.rest_framework import DjangoFilterBackend
 from djoser.views import UserViewSet
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import JSONParser
 from rest_framework.permissions import SAFE_METHODS, AllowAny, IsAuthenticated
+from rest_framework.renderers import JSONRenderer
 from rest_framework.response import Response
 
-from api.filters import IngredientFilter, RecipeFilter
-from api.pagination import LimitPagePagination
+from api.cache import INGREDIENTS, TAGS, AnonymousListCacheMixin
+from api.conditional import catalogue_response, recipe_etag, version_etag
+from api.filters import RecipeFilter
+from api.ingredient_index import ingredient_index
+from api.pagination import CachedCountPagination
+from api.parsers import ImageMultiPartParser, MultiPartJSONParser
 from api.permissions import IsAuthorOrReadOnly
 from api.serializers import (
     CurentUserSerializer, IngredientsSerializer, RecipeMiniSerializer,
     RecipeSerializer, SubscriptionSerializer, TagSerializer
 )
-from api.services import shopping_cart_list
+from api.renderers import CSVRenderer, PlainTextRenderer
+from api.services import SHOPPING_LIST_FORMATS
+from recipes.histogram import cooking_time_histogram
 from recipes.models import (
     Favorite, Ingredient, Recipe, ShoppingCart, Subscription, Tag
 )
+from recipes.shortlinks import encode, short_links
 
 
 User = get_user_model()
@@ -29,7 +42,7 @@ User = get_user_model()
 class CurentUserViewSet(UserViewSet):
     queryset = User.objects.all()
     serializer_class = CurentUserSerializer
-    pagination_class = LimitPagePagination
+    pagination_class = CachedCountPagination
     permission_classes = (AllowAny,)
 
     def get_permissions(self):
@@ -51,6 +64,7 @@ class CurentUserViewSet(UserViewSet):
         detail=False,
         methods=['PUT', 'DELETE'],
         permission_classes=(IsAuthenticated,),
+        parser_classes=(JSONParser, ImageMultiPartParser),
         url_path='me/avatar',
     )
     def avatar(self, request):
@@ -62,7 +76,10 @@ class CurentUserViewSet(UserViewSet):
         )
         if request.method == 'DELETE':
             if user.avatar:
-                user.avatar.delete(save=True)
+                storage, name = user.avatar.storage, user.avatar.name
+                user.avatar = None
+                user.save(update_fields=['avatar'])
+                storage.delete(name)
                 return Response(status=status.HTTP_204_NO_CONTENT)
             return Response('Аватар не найден',
                             status=status.HTTP_404_NOT_FOUND)
@@ -90,12 +107,8 @@ class CurentUserViewSet(UserViewSet):
         if not created:
             raise ValidationError('Вы уже подписаны на этого автора.')
         serializer = SubscriptionSerializer(
-            author,
-            context={
-                'request': request,
-                'recipes_limit': int(request.GET.get('recipes_limit', 10**10)),
-                'avatar': user.avatar.url
-            }
+            self.get_subscriptions_queryset().get(id=author.id),
+            context=self.get_subscriptions_context()
         )
         return Response(serializer.data, status=status.HTTP_201_CREATED)
 
@@ -105,52 +118,89 @@ class CurentUserViewSet(UserViewSet):
         permission_classes=(IsAuthenticated,)
     )
     def subscriptions(self, request):
-        user = request.user
-        queryset = User.objects.filter(authors__user=user)
+        queryset = self.get_subscriptions_queryset().filter(
+            authors__user=request.user
+        )
         page = self.paginate_queryset(queryset)
         serializer = SubscriptionSerializer(
-            page or queryset,
+            queryset if page is None else page,
             many=True,
-            context={
-                'request': request,
-                'recipes_limit': int(request.GET.get('recipes_limit', 10**10)),
-                'avatar': user.avatar.url
-            },
+            context=self.get_subscriptions_context(),
         )
         return (
             self.get_paginated_response(serializer.data) if page is not None
             else Response(serializer.data)
         )
 
+    @staticmethod
+    def get_subscriptions_queryset():
+        return User.objects.annotate(
+            is_subscribed=Value(True, output_field=BooleanField())
+        )
+
+    def get_subscriptions_context(self):
+        try:
+            recipes_limit = int(self.request.query_params['recipes_limit'])
+        except (KeyError, ValueError):
+            recipes_limit = None
+        return {
+            'request': self.request,
+            'recipes_limit': (
+                recipes_limit if recipes_limit is None or recipes_limit >= 0
+                else None
+            ),
+        }
+
 
+@method_decorator(condition(etag_func=version_etag(TAGS)), name='list')
+@method_decorator(condition(etag_func=version_etag(TAGS)), name='retrieve')
 class TagViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        return catalogue_response(
+            TAGS,
+            lambda: self.get_serializer(self.get_queryset(), many=True).data
+        )
+
 
+@method_decorator(
+    condition(etag_func=version_etag(INGREDIENTS)), name='list'
+)
+@method_decorator(
+    condition(etag_func=version_etag(INGREDIENTS)), name='retrieve'
+)
 class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all().order_by('id')
     serializer_class = IngredientsSerializer
     permission_classes = (AllowAny,)
     pagination_class = None
-    filter_backends = (DjangoFilterBackend,)
-    filterset_class = IngredientFilter
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name', '')
+        if not name:
+            return catalogue_response(INGREDIENTS, ingredient_index.search)
+        return Response(ingredient_index.search(name))
 
 
-class RecipeViewSet(viewsets.ModelViewSet):
+@method_decorator(condition(etag_func=recipe_etag), name='retrieve')
+class RecipeViewSet(AnonymousListCacheMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     serializer_class = RecipeSerializer
-    pagination_class = LimitPagePagination
+    pagination_class = CachedCountPagination
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
-    search_fields = ('tags__slug',)
     permission_classes = (IsAuthenticated, IsAuthorOrReadOnly,)
+    parser_classes = (JSONParser, MultiPartJSONParser)
+    facet_query_param = 'facets'
 
     def get_permissions(self):
         return (
             (AllowAny(),) if self.request.method in SAFE_METHODS
+            and self.action != 'download_shopping_cart'
             else super().get_permissions()
         )
 
@@ -162,31 +212,94 @@ class RecipeViewSet(viewsets.ModelViewSet):
         user = self.request.user
         if user.is_authenticated:
             queryset = queryset.annotate(
+                is_favorited=Exists(
+                    Favorite.objects.filter(user=user, recipe=OuterRef('pk'))
+                ),
                 is_in_shopping_cart=Exists(
                     ShoppingCart.objects.filter(user=user,
                                                 recipe=OuterRef('pk'))
+                ),
+                is_author_subscribed=Exists(
+                    Subscription.objects.filter(
+                        user=user, author=OuterRef('author')
+                    )
                 )
             )
         if tags:
-            queryset = queryset.filter(tags__slug__in=tags).distinct()
+            queryset = queryset.filter(Exists(
+                Recipe.tags.through.objects.filter(
+                    recipe=OuterRef('pk'), tag__slug__in=tags
+                )
+            ))
         if author:
             queryset = queryset.filter(author__id=author)
         if favorite:
             queryset = queryset.filter(favorites__user=user)
         return queryset.order_by('-created_at')
 
+    def list(self, request, *args, **kwargs):
+        response = super().list(request, *args, **kwargs)
+        facets = request.query_params.get(self.facet_query_param, '')
+        if 'cooking_time' in facets.split(','):
+            response.data['facets'] = {
+                'cooking_time': self.get_cooking_time_facet(request)
+            }
+        return response
+
+    def get_cooking_time_facet(self, request):
+        # Без собственного фильтра, чтобы были видны все диапазоны.
+        params = request.query_params.copy()
+        for param in ('cooking_time_min', 'cooking_time_max'):
+            params.pop(param, None)
+        queryset = self.filterset_class(
+            params, queryset=self.get_queryset(), request=request
+        ).qs
+        return [
+            {'min': lower, 'max': upper, 'count': count}
+            for lower, upper, count in cooking_time_histogram(queryset)
+        ]
+
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
 
+    @action(
+        detail=False,
+        methods=['POST'],
+        permission_classes=(IsAuthenticated,),
+        parser_classes=(JSONParser,)
+    )
+    def bulk(self, request):
+        if (
+            isinstance(request.data, list)
+            and len(request.data) > settings.MAX_BULK_RECIPES
+        ):
+            raise ValidationError(
+                f'За один запрос можно создать не больше '
+                f'{settings.MAX_BULK_RECIPES} рецептов.'
+            )
+        serializer = self.get_serializer(
+            data=request.data, many=True, allow_empty=False
+        )
+        serializer.is_valid(raise_exception=True)
+        self.perform_create(serializer)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
     @action(
         detail=True,
         methods=['GET'],
         url_path='get-link'
     )
     def get_short_link(self, request, pk=None):
-        recipe = get_object_or_404(Recipe, pk=pk)
+        try:
+            recipe_id = int(pk)
+        except ValueError:
+            raise Http404
+        if not short_links.exists(recipe_id):
+            raise Http404
         return Response(
-            {'short-link': request.build_absolute_uri(f'/s/{recipe.id}')},
+            {'short-link': request.build_absolute_uri(reverse(
+                'recipes:short-link-redirect', args=[encode(recipe_id)]
+            ))},
             status=status.HTTP_200_OK
         )
 
@@ -194,28 +307,30 @@ class RecipeViewSet(viewsets.ModelViewSet):
         detail=False,
         methods=['GET'],
         url_path='download_shopping_cart',
-        permission_classes=(IsAuthenticated,)
+        permission_classes=(IsAuthenticated,),
+        renderer_classes=(PlainTextRenderer, CSVRenderer, JSONRenderer)
     )
     def download_shopping_cart(self, request):
-        cart = request.user.shoppingcarts.prefetch_related(
-            'recipe__recipeingredients__ingredient'
-        ).annotate(
-            ingredient_name=F('recipe__recipeingredients__ingredient__name'),
-            ingredient_unit=F(
-                'recipe__recipeingredients__ingredient__measurement_unit'
+        user = request.user
+        ingredients = user.shoppinglistitems.values(
+            'amount',
+            ingredient_name=F('ingredient__name'),
+            ingredient_unit=F('ingredient__measurement_unit'),
+        ).order_by('ingredient_name', 'ingredient_unit')
+        recipe_names = Recipe.objects.filter(
+            shoppingcarts__user=user
+        ).values_list('name', flat=True)
+        renderer = request.accepted_renderer
+        response = StreamingHttpResponse(
+            SHOPPING_LIST_FORMATS[renderer.format](
+                ingredients.iterator(), recipe_names.iterator()
             ),
-            total_amount=Sum('recipe__recipeingredients__amount')
-        ).values(
-            'recipe__id',
-            'ingredient_name',
-            'ingredient_unit',
-            'total_amount'
+            content_type=f'{renderer.media_type}; charset=utf-8'
         )
-        cart_recipes = Recipe.objects.filter(id__in=cart.values('recipe__id'))
-        return FileResponse(
-            shopping_cart_list(cart, cart_recipes),
-            content_type='text/plain; charset=utf-8'
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping_list.{renderer.format}"'
         )
+        return response
 
     @staticmethod
     def manage_user_recipe_relation(request, pk, model):
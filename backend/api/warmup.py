@@ -0,0 +1,24 @@
+from django.db import connections
+from django.urls import get_resolver
+
+from api.cache import INGREDIENTS, TAGS
+from api.conditional import catalogue_response
+from api.ingredient_index import ingredient_index
+from api.serializers import TagSerializer
+from recipes.models import Tag
+
+
+def warm_up():
+    """Импортирует все представления и загружает каталоги тэгов
+    и продуктов в память процесса.
+
+    Вызывается в мастере gunicorn до запуска воркеров: они получают
+    готовые данные через fork, и первые запросы не ждут импортов
+    и базы. Соединения с базой закрываются, чтобы не попасть в воркеры.
+    """
+    get_resolver().url_patterns
+    catalogue_response(
+        TAGS, lambda: TagSerializer(Tag.objects.all(), many=True).data
+    )
+    catalogue_response(INGREDIENTS, ingredient_index.search)
+    connections.close_all()
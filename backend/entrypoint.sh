@@ -5,4 +5,9 @@ cp -r /app/collected_static/. /backend_static/static
 python manage.py import_ingredients
 python manage.py import_tags
 
-gunicorn --bind 0.0.0.0:8080 foodgram_backend.wsgi
\ No newline at end of file
+# SERVER_MODE=asgi - воркеры uvicorn с асинхронными запросами на чтение.
+if [ "$SERVER_MODE" = "asgi" ]; then
+    gunicorn --config gunicorn.conf.py --bind 0.0.0.0:8080 -k uvicorn.workers.UvicornWorker foodgram_backend.asgi:application
+else
+    gunicorn --config gunicorn.conf.py --bind 0.0.0.0:8080 foodgram_backend.wsgi
+fi
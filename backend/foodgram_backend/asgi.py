@@ -9,8 +9,49 @@ https://docs.djangoproject.com/en/3.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
+from django.core.handlers.asgi import ASGIHandler
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'foodgram_backend.settings')
 
-application = get_asgi_application()
+ASGI_URLCONF = 'foodgram_backend.asgi_urls'
+
+
+class AsyncReadsASGIHandler(ASGIHandler):
+    """Направляет запросы по маршрутам ASGI_URLCONF, где частые запросы
+    на чтение обрабатываются асинхронно."""
+
+    def create_request(self, scope, body_file):
+        request, error_response = super().create_request(scope, body_file)
+        if request is not None:
+            request.urlconf = ASGI_URLCONF
+        return request, error_response
+
+    async def send_response(self, response, send):
+        """Отправляет и асинхронное содержимое потоковых ответов
+        (async_streaming_content), которого нет в Django 3.2."""
+        chunks = getattr(response, 'async_streaming_content', None)
+        if chunks is None:
+            return await super().send_response(response, send)
+
+        async def send_with_chunks(message):
+            if (
+                message['type'] == 'http.response.body'
+                and not message.get('more_body')
+            ):
+                try:
+                    async for chunk in chunks:
+                        await send({
+                            'type': 'http.response.body',
+                            'body': chunk,
+                            'more_body': True,
+                        })
+                finally:
+                    await chunks.aclose()
+            await send(message)
+
+        await super().send_response(response, send_with_chunks)
+
+
+django.setup(set_prefix=False)
+application = AsyncReadsASGIHandler()
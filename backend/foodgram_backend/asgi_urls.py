@@ -0,0 +1,28 @@
+"""Маршруты ASGI-приложения.
+
+Частые запросы на чтение обслуживаются асинхронными представлениями,
+остальные - теми же синхронными, что и под WSGI. Имена маршрутов
+для reverse() берутся из foodgram_backend.urls.
+"""
+from django.urls import path, re_path
+
+from api import async_views
+from foodgram_backend.urls import urlpatterns as sync_urlpatterns
+
+urlpatterns = [
+    re_path(r'^api/recipes/$', async_views.recipe_list),
+    re_path(
+        r'^api/recipes/download_shopping_cart/$',
+        async_views.download_shopping_cart
+    ),
+    re_path(r'^api/recipes/(?P<pk>[^/.]+)/$', async_views.recipe_detail),
+    re_path(r'^api/tags/$', async_views.tag_list),
+    re_path(r'^api/tags/(?P<pk>[^/.]+)/$', async_views.tag_detail),
+    re_path(r'^api/ingredients/$', async_views.ingredient_list),
+    re_path(
+        r'^api/ingredients/(?P<pk>[^/.]+)/$', async_views.ingredient_detail
+    ),
+    re_path(r'^s/(?P<code>[a-zA-Z]+)/$', async_views.redirect_short_link),
+    path('s/<int:short_id>/', async_views.redirect_legacy_short_link),
+    *sync_urlpatterns,
+]
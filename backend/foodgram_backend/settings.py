@@ -83,6 +83,45 @@ else:
         }
     }
 
+# Сброс кэша держится на версиях в кэше, поэтому по умолчанию он общий
+# для всех воркеров. locmem у каждого процесса свой: только для одного
+# воркера (gunicorn.conf.py тогда запускает один). memcached, в отличие
+# от файлового кэша, выполняет add() и incr() атомарно.
+CACHE_BACKEND = os.getenv('CACHE_BACKEND', 'file')
+if CACHE_BACKEND == 'memcached':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', '127.0.0.1:11211'),
+        }
+    }
+elif CACHE_BACKEND == 'locmem':
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+            'LOCATION': 'foodgram',
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+            },
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+            'LOCATION': os.getenv('CACHE_LOCATION', '/tmp/foodgram_cache'),
+            'OPTIONS': {
+                'MAX_ENTRIES': int(os.getenv('CACHE_MAX_ENTRIES', 10000))
+            },
+        }
+    }
+# Счётчики попаданий в кэш ответов (cache_stats). У файлового кэша
+# incr() теряет обновления, а каждая запись - два файла на запрос,
+# поэтому там они по умолчанию выключены.
+RESPONSE_CACHE_STATS = os.getenv(
+    'RESPONSE_CACHE_STATS', str(CACHE_BACKEND != 'file')
+) == 'True'
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -112,6 +151,10 @@ USE_TZ = True
 
 MEDIA_URL = 'media/'
 MEDIA_ROOT = BASE_DIR / 'media'
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+MAX_IMAGE_UPLOAD_SIZE = int(
+    os.getenv('MAX_IMAGE_UPLOAD_SIZE', 10 * 1024 * 1024)
+)
 
 STATIC_URL = 'static/'
 STATIC_ROOT = BASE_DIR / 'collected_static'
@@ -144,6 +187,27 @@ CORS_ALLOWED_ORIGINS = [
 ]
 
 PAGINATION_PAGE_SIZE = 6
+PAGINATION_MAX_PAGE_SIZE = 100
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 30)
+)
+PAGINATION_COUNT_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_COUNT_ESTIMATE_THRESHOLD', 100000)
+)
+MAX_BULK_RECIPES = int(os.getenv('MAX_BULK_RECIPES', 100))
+SHORT_LINK_CACHE_SIZE = int(os.getenv('SHORT_LINK_CACHE_SIZE', 10000))
+SHORT_LINK_CACHE_TIMEOUT = int(os.getenv('SHORT_LINK_CACHE_TIMEOUT', 3600))
+SHORT_LINK_MISSING_CACHE_TIMEOUT = int(
+    os.getenv('SHORT_LINK_MISSING_CACHE_TIMEOUT', 30)
+)
+ASYNC_THREAD_POOL_SIZE = int(os.getenv('ASYNC_THREAD_POOL_SIZE', 8))
+RECIPE_LIST_CACHE_TIMEOUT = int(os.getenv('RECIPE_LIST_CACHE_TIMEOUT', 300))
+COOKING_TIME_HISTOGRAM_CACHE_TIMEOUT = int(
+    os.getenv('COOKING_TIME_HISTOGRAM_CACHE_TIMEOUT', 60)
+)
+RECIPE_FRAGMENT_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_FRAGMENT_CACHE_TIMEOUT', 3600)
+)
 
 # Суперпользователь
 SUPERUSER_USERNAME = os.getenv('SUPERUSER_USERNAME', 'admin')
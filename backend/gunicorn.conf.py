@@ -0,0 +1,20 @@
+import gc
+import os
+
+# Приложение загружается в мастере до запуска воркеров.
+preload_app = os.getenv('GUNICORN_PRELOAD', 'True') == 'True'
+
+# Кэш в памяти процесса не виден другим воркерам: записи одного
+# не сбрасывали бы кэш остальных.
+if os.getenv('CACHE_BACKEND') == 'locmem':
+    workers = 1
+
+
+def when_ready(server):
+    if not preload_app:
+        return
+    from api.warmup import warm_up
+    warm_up()
+    # Объекты мастера исключаются из сборки мусора, чтобы воркеры
+    # не копировали их страницы памяти при обходе.
+    gc.freeze()
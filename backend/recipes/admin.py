@@ -1,32 +1,56 @@
-import numpy as np
 from django import forms
 from django.contrib import admin
+from django.contrib.admin.widgets import AutocompleteSelect
 from django.contrib.auth.admin import UserAdmin
 from django.contrib.auth.models import Group
-from django.db.models import Case, CharField, ManyToManyField, Value, When
+from django.db.models import (
+    Case, CharField, Manager, ManyToManyField, Prefetch, Value, When
+)
 from django.forms import CheckboxSelectMultiple
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 
+from recipes.counters import actual_count
+from recipes.histogram import cooking_time_histogram, parse_range
+from recipes.images import rendition_urls
 from recipes.models import (
-    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart, Subscription,
-    Tag, User
+    Favorite, Ingredient, Recipe, RecipeIngredient, ShoppingCart,
+    ShoppingListItem, Subscription, Tag, User
 )
+from recipes.paginator import EstimatedCountPaginator
 
 
 admin.site.unregister(Group)
 
 
 link_data = {
-    'Подписки': ('recipes_subscription_changelist', 'authors'),
-    'Рецепты': ('recipes_recipe_changelist', 'recipes'),
-    'Избранные рецепты': ('recipes_favorite_changelist', 'favorites'),
-    'Подписан': ('recipes_subscription_changelist', 'subscribers'),
+    'Подписки': ('recipes_subscription_changelist', 'subscribers_count'),
+    'Рецепты': ('recipes_recipe_changelist', 'recipes_count'),
+    'Избранные рецепты': ('recipes_favorite_changelist', 'favorites_count'),
+    'Подписан': ('recipes_subscription_changelist', 'subscriptions_count'),
 }
 
 
+def thumbnail_html(field_file):
+    urls = rendition_urls(field_file)
+    if not urls:
+        return None
+    thumbnail = urls['thumbnail']
+    # Пока копий нет, показываем оригинал.
+    source = (
+        f'<source srcset="{thumbnail["webp"]}" type="image/webp">'
+        if thumbnail['webp'] else ''
+    )
+    return (
+        f'<picture>{source}<img src="{thumbnail["jpeg"] or field_file.url}" '
+        'width="100px" height="100px" /></picture>'
+    )
+
+
 def generate_link(model, filter, url_name, field_name):
-    count = getattr(model, field_name).count()
+    count = getattr(model, field_name)
+    if isinstance(count, Manager):
+        count = count.count()
     if count > 0:
         return (
             f'<a href="{reverse("admin:" + url_name)}'
@@ -40,37 +64,74 @@ class CookingTimeFilter(admin.SimpleListFilter):
     title = 'Время готовки (мин)'
     parameter_name = 'cooking_time'
 
-    def _filter(self, min_time, max_time, object_to_filter):
-        return (
-            object_to_filter.filter(cooking_time__range=(min_time, max_time))
-        )
-
     def lookups(self, request, model_admin):
-        cooking_times = model_admin.model.objects.values_list(
-            'cooking_time', flat=True
-        )
-        if not cooking_times:
-            return []
-        edges = np.linspace(
-            min(cooking_times), max(cooking_times), 4, dtype=int
-        )
-        if len(edges) < 4:
-            return []
         return [
-            (
-                (edges[i], edges[i + 1]),
-                f'{edges[i]} - {edges[i + 1]} ( '
-                f'{self._filter(edges[i], edges[i+1], Recipe.objects).count()}'
-                ')'
+            (f'{lower}-{upper}', f'{lower} - {upper} ({count})')
+            for lower, upper, count in cooking_time_histogram(
+                model_admin.model.objects.all()
             )
-            for i in range(len(edges) - 1)
         ]
 
     def queryset(self, request, queryset):
-        if self.value():
-            min_time, max_time = eval(self.value())
-            return self._filter(min_time, max_time, queryset)
-        return queryset
+        time_range = parse_range(self.value())
+        if time_range is None:
+            return queryset
+        return queryset.filter(cooking_time__range=time_range)
+
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """Фильтр по связанной модели с поиском через autocomplete вместо
+    списка всех объектов в боковой панели."""
+    template = 'admin/autocomplete_filter.html'
+
+    def __init__(self, field, request, params, model, model_admin,
+                 field_path):
+        super().__init__(
+            field, request, params, model, model_admin, field_path
+        )
+        self.preserved_params = [
+            (name, value) for name, value in request.GET.items()
+            if name not in (self.lookup_kwarg, self.lookup_kwarg_isnull, 'p')
+        ]
+        # Для обратной связи многие-ко-многим autocomplete ищет по внешнему
+        # ключу промежуточной модели.
+        source_field = (
+            field.through._meta.get_field(field.field.m2m_field_name())
+            if field.auto_created and field.many_to_many else field
+        )
+        remote_model = source_field.remote_field.model
+        self.widget = forms.ModelChoiceField(
+            queryset=remote_model._default_manager.all(),
+            widget=AutocompleteSelect(
+                source_field, model_admin.admin_site,
+                attrs={
+                    'onchange': (
+                        'if (!this.value) this.removeAttribute("name");'
+                        'this.form.submit();'
+                    ),
+                    'style': 'width: 100%;',
+                }
+            ),
+            required=False,
+        ).widget
+
+    def has_output(self):
+        return True
+
+    def field_choices(self, field, request, model_admin):
+        return []
+
+    def rendered_widget(self):
+        return self.widget.render(self.lookup_kwarg, self.lookup_val)
+
+
+class AutocompleteFilterAdminMixin:
+
+    @property
+    def media(self):
+        return super().media + AutocompleteSelect(
+            None, self.admin_site
+        ).media
 
 
 class HasRecipesFilter(admin.SimpleListFilter):
@@ -85,10 +146,11 @@ class HasRecipesFilter(admin.SimpleListFilter):
 
     def queryset(self, request, queryset):
         value = self.value()
-        return (
-            queryset.filter(recipes__isnull=False)
-            if value == 'yes' else queryset
-        )
+        if value == 'yes':
+            return queryset.filter(recipes_count__gt=0)
+        if value == 'no':
+            return queryset.filter(recipes_count=0)
+        return queryset
 
 
 class RecipeTagInline(admin.TabularInline):
@@ -141,7 +203,7 @@ class RecipeIngredientInline(admin.TabularInline):
 
 
 @admin.register(Recipe)
-class RecipeAdmin(admin.ModelAdmin):
+class RecipeAdmin(AutocompleteFilterAdminMixin, admin.ModelAdmin):
     list_display = (
         'name',
         'author',
@@ -154,15 +216,17 @@ class RecipeAdmin(admin.ModelAdmin):
     search_fields = (
         'author__username',
         'name',
-        'tags',
+        'tags__name',
         'ingredients__name',
     )
     autocomplete_fields = ('author',)
     list_filter = (
         'tags',
-        'author',
+        ('author', AutocompleteFilter),
         CookingTimeFilter
     )
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     inlines = (RecipeIngredientInline, RecipeTagInline, FavoriteInline)
     fieldsets = (
         (None, {'fields': ('name', 'author',)}),
@@ -191,6 +255,22 @@ class RecipeAdmin(admin.ModelAdmin):
     def lookup_allowed(self, key, value):
         return True
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).select_related(
+            'author'
+        ).prefetch_related(
+            'tags',
+            Prefetch(
+                'recipeingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+
+    def save_related(self, request, form, formsets, change):
+        ShoppingListItem.objects.remove_recipe(form.instance.id)
+        super().save_related(request, form, formsets, change)
+        ShoppingListItem.objects.add_recipe(form.instance.id)
+
     @admin.display(description='Продукты')
     @mark_safe
     def get_ingredients(self, recipe):
@@ -200,9 +280,9 @@ class RecipeAdmin(admin.ModelAdmin):
             for recipe in recipe.recipeingredients.all())
         )
 
-    @admin.display(description='В избранном')
+    @admin.display(description='В избранном', ordering='favorites_count')
     def favorite_count(self, recipe):
-        return recipe.favorites.count()
+        return recipe.favorites_count
 
     @admin.display(description='Тэги')
     @mark_safe
@@ -212,24 +292,26 @@ class RecipeAdmin(admin.ModelAdmin):
     @admin.display(description='Картинка')
     @mark_safe
     def thumbnail(self, recipe):
-        if recipe.image:
-            return (
-                '<img src="{0}" width="100px" height="100px" />'.format(
-                    recipe.image.url
-                )
-            )
+        return thumbnail_html(recipe.image)
 
 
 @admin.register(Ingredient)
-class IngredientAdmin(admin.ModelAdmin):
+class IngredientAdmin(AutocompleteFilterAdminMixin, admin.ModelAdmin):
     list_display = (
         'name', 'measurement_unit', 'number_of_recipes'
     )
-    search_fields = ('name', 'measurement_unit', 'recipes')
-    list_filter = ('recipes',)
+    search_fields = ('name', 'measurement_unit', 'recipes__name')
+    list_filter = (('recipes', AutocompleteFilter),)
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=actual_count(RecipeIngredient, 'ingredient')
+        )
 
     def generate_ingredient_link(self, ingredient):
-        count = ingredient.recipes.count()
+        count = ingredient.recipes_count
         if count > 0:
             return (
                 f'<a href="{reverse("admin:recipes_recipe_changelist")}'
@@ -238,7 +320,7 @@ class IngredientAdmin(admin.ModelAdmin):
         return 0
 
     @mark_safe
-    @admin.display(description='Рецепты')
+    @admin.display(description='Рецепты', ordering='recipes_count')
     def number_of_recipes(self, ingredient):
         return self.generate_ingredient_link(ingredient)
 
@@ -252,8 +334,13 @@ class TagAdmin(admin.ModelAdmin):
     def lookup_allowed(self, key, value):
         return True
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).annotate(
+            recipes_count=actual_count(Recipe.tags.through, 'tag')
+        )
+
     def generate_tag_link(self, tag):
-        count = tag.recipes.count()
+        count = tag.recipes_count
         if count > 0:
             return (
                 f'<a href="{reverse("admin:recipes_recipe_changelist")}'
@@ -262,7 +349,7 @@ class TagAdmin(admin.ModelAdmin):
         return 0
 
     @mark_safe
-    @admin.display(description='Рецепты')
+    @admin.display(description='Рецепты', ordering='recipes_count')
     def number_of_recipes(self, tag):
         return self.generate_tag_link(tag)
 
@@ -270,6 +357,7 @@ class TagAdmin(admin.ModelAdmin):
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'get_recipe_link')
+    list_select_related = ('user', 'recipe')
 
     @admin.display(description='Рецепт')
     @mark_safe
@@ -284,6 +372,7 @@ class FavoriteAdmin(admin.ModelAdmin):
 @admin.register(ShoppingCart)
 class ShoppingCartAdmin(admin.ModelAdmin):
     list_display = ('user', 'get_recipe_link')
+    list_select_related = ('user', 'recipe')
 
     @admin.display(description='Рецепт')
     @mark_safe
@@ -315,6 +404,8 @@ class UserAdmin(UserAdmin):
         HasRecipesFilter
     )
     search_fields = ('email', 'username')
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
     fieldsets = (
         (None, {'fields': ('username', 'email', 'password')}),
         ('Персональная информация', {'fields': (
@@ -351,6 +442,7 @@ class UserAdmin(UserAdmin):
     def get_queryset(self, request):
         return (
             super().get_queryset(request).annotate(
+                favorites_count=actual_count(Favorite, 'user'),
                 is_staff_display=Case(
                     When(is_staff=True, then=Value('Админ')),
                     default=Value('Пользователь'),
@@ -360,29 +452,29 @@ class UserAdmin(UserAdmin):
         )
 
     @mark_safe
-    @admin.display(description='Подписки')
+    @admin.display(description='Подписки', ordering='subscribers_count')
     def number_of_subscribers(self, user):
         return generate_link(
             user, 'author', *link_data['Подписки']
         )
 
     @mark_safe
-    @admin.display(description='Подписан')
+    @admin.display(description='Подписан', ordering='subscriptions_count')
     def number_of_subscriptions(self, user):
         return generate_link(
-            user, 'author', *link_data['Подписан']
+            user, 'user', *link_data['Подписан']
         )
 
     @mark_safe
-    @admin.display(description='Рецептов')
+    @admin.display(description='Рецептов', ordering='recipes_count')
     def number_of_recipes(self, user):
         return generate_link(user, 'author', *link_data['Рецепты'])
 
     @mark_safe
-    @admin.display(description='Избранных')
+    @admin.display(description='Избранных', ordering='favorites_count')
     def number_of_favorites(self, user):
         return generate_link(
-            user, 'author', *link_data['Избранные рецепты']
+            user, 'user', *link_data['Избранные рецепты']
         )
 
     @admin.display(description='Штат')
@@ -401,18 +493,13 @@ class UserAdmin(UserAdmin):
     @admin.display(description='Аватар')
     @mark_safe
     def avatar_image(self, user):
-        if user.avatar:
-            return (
-                '<img src="{0}" width="100px" height="100px" />'.format(
-                    user.avatar.url
-                )
-            )
-        return ' '
+        return thumbnail_html(user.avatar) or ' '
 
 
 @admin.register(Subscription)
 class SubscriptionAdmin(admin.ModelAdmin):
     list_display = ('user', 'get_author_link')
+    list_select_related = ('user', 'author')
 
     @admin.display(description='Автор')
     @mark_safe
@@ -0,0 +1,59 @@
+from functools import partial
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models import Max
+
+from recipes.catalogue import catalogue_imported
+from recipes.counters import actual_count
+from recipes.images import generate_renditions
+from recipes.models import Recipe, RecipeIngredient, User
+from recipes.search import index_recipes
+
+
+def bulk_create_recipes(recipes, using=DEFAULT_DB_ALIAS, renditions=True):
+    """Создаёт рецепты с тэгами и продуктами тремя bulk_create.
+
+    recipes - список (Recipe, id тэгов, {id продукта: мера}). Заодно
+    делает то, что для одного рецепта делают сигналы post_save: индекс
+    поиска, уменьшенные копии изображений, счётчики авторов, сброс кэша.
+    Вызывать внутри транзакции; копии изображений создаются после
+    её коммита.
+    """
+    objects = [recipe for recipe, _, _ in recipes]
+    manager = Recipe.objects.using(using)
+    manager.bulk_create(objects)
+    if not connections[using].features.can_return_rows_from_bulk_insert:
+        # SQLite не возвращает id из bulk_create. До конца транзакции
+        # в таблицу пишет только она, поэтому новые строки получили
+        # подряд идущие id, последний из которых - наибольший.
+        last_id = manager.aggregate(Max('id'))['id__max']
+        for id, recipe in enumerate(objects, last_id - len(objects) + 1):
+            recipe.id = id
+    Recipe.tags.through.objects.using(using).bulk_create(
+        Recipe.tags.through(recipe_id=recipe.id, tag_id=tag_id)
+        for recipe, tag_ids, _ in recipes
+        for tag_id in tag_ids
+    )
+    RecipeIngredient.objects.using(using).bulk_create(
+        RecipeIngredient(recipe_id=recipe.id, ingredient_id=id, amount=amount)
+        for recipe, _, amounts in recipes
+        for id, amount in amounts.items()
+    )
+    index_recipes([recipe.id for recipe in objects], using)
+    if renditions:
+        # Копии пишутся только в хранилище, и транзакция не должна
+        # держать блокировки, пока обрабатываются сотни изображений.
+        transaction.on_commit(
+            partial(generate_all, [recipe.image for recipe in objects]),
+            using=using
+        )
+    User.objects.using(using).filter(
+        id__in={recipe.author_id for recipe in objects}
+    ).update(recipes_count=actual_count(Recipe, 'author'))
+    catalogue_imported.send(sender=Recipe, result=None, using=using)
+    return objects
+
+
+def generate_all(field_files):
+    for field_file in field_files:
+        generate_renditions(field_file)
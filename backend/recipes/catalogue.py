@@ -0,0 +1,259 @@
+import csv
+import json
+import os
+from collections import namedtuple
+from functools import partial
+from hashlib import sha256
+from io import StringIO
+from itertools import islice
+
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.dispatch import Signal
+
+from recipes.models import CatalogueImport
+
+BATCH_SIZE = 1000
+CHECKSUM_CHUNK_SIZE = 1024 * 1024
+
+ImportResult = namedtuple('ImportResult', ('inserted', 'updated', 'skipped'))
+
+# Отправляется после импорта, изменившего каталог: массовая вставка
+# не вызывает post_save, а кэш каталога нужно сбросить.
+catalogue_imported = Signal()
+
+
+def file_checksum(path):
+    checksum = sha256()
+    with open(path, 'rb') as file:
+        for chunk in iter(partial(file.read, CHECKSUM_CHUNK_SIZE), b''):
+            checksum.update(chunk)
+    return checksum.hexdigest()
+
+
+def read_rows(path, fields):
+    """Строки файла по одной: CSV без заголовка (столбцы в порядке
+    fields), JSON Lines или JSON-массив."""
+    extension = os.path.splitext(path)[1].lower()
+    with open(path, encoding='utf-8', newline='') as file:
+        if extension == '.csv':
+            for line, values in enumerate(csv.reader(file), 1):
+                if not any(values):
+                    continue
+                if len(values) != len(fields):
+                    raise ValueError(
+                        f'Строка {line}: ожидается столбцов {len(fields)}, '
+                        f'получено {len(values)}.'
+                    )
+                yield dict(zip(fields, (value.strip() for value in values)))
+        elif extension == '.jsonl':
+            for line, text in enumerate(file, 1):
+                if text.strip():
+                    yield pick_fields(json.loads(text), fields, line)
+        elif extension == '.json':
+            for line, item in enumerate(json.load(file), 1):
+                yield pick_fields(item, fields, line)
+        else:
+            raise ValueError(f'Неизвестный формат файла {extension}.')
+
+
+def pick_fields(item, fields, line):
+    try:
+        return {field: item[field] for field in fields}
+    except (KeyError, TypeError):
+        raise ValueError(f'Запись {line}: нужны поля {", ".join(fields)}.')
+
+
+def batches(iterable, size):
+    iterator = iter(iterable)
+    return iter(lambda: list(islice(iterator, size)), [])
+
+
+class CSVStream:
+    """Файлоподобный поток строк CSV для COPY: строки формируются
+    по мере чтения, а не заранее."""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.buffer = StringIO()
+        self.writer = csv.writer(self.buffer, quoting=csv.QUOTE_NONNUMERIC)
+        self.pending = ''
+
+    def read(self, size=-1):
+        while size < 0 or len(self.pending) < size:
+            row = next(self.rows, None)
+            if row is None:
+                break
+            self.writer.writerow(row)
+            self.pending += self.buffer.getvalue()
+            self.buffer.seek(0)
+            self.buffer.truncate()
+        if size < 0:
+            size = len(self.pending)
+        data, self.pending = self.pending[:size], self.pending[size:]
+        return data
+
+
+class Upsert:
+    """Вставка строк с обновлением существующих записей по уникальному
+    ключу и точным подсчётом добавленных, изменённых и пропущенных.
+
+    В PostgreSQL строки загружаются COPY во временную таблицу и сливаются
+    одним INSERT ... ON CONFLICT, в SQLite (и для небольших наборов с
+    copy=False) - пачками INSERT ... ON CONFLICT. Запись считается
+    изменённой, только если значения update_fields отличаются
+    от сохранённых.
+    """
+
+    def __init__(self, model, unique_fields, update_fields=(),
+                 using=DEFAULT_DB_ALIAS, batch_size=BATCH_SIZE, copy=True):
+        self.model = model
+        self.fields = [*unique_fields, *update_fields]
+        self.unique_fields = unique_fields
+        self.update_fields = update_fields
+        self.connection = connections[using]
+        max_params = self.connection.features.max_query_params
+        self.batch_size = (
+            min(batch_size, max_params // len(self.fields)) if max_params
+            else batch_size
+        )
+        self.model_fields = [
+            model._meta.get_field(field) for field in self.fields
+        ]
+        self.table = self.quote(model._meta.db_table)
+        postgresql = self.connection.vendor == 'postgresql'
+        self.copy = copy and postgresql
+        self.distinct_operator = 'IS DISTINCT FROM' if postgresql else 'IS NOT'
+
+    def quote(self, name):
+        return self.connection.ops.quote_name(name)
+
+    def columns(self, fields):
+        return ', '.join(
+            self.quote(self.model._meta.get_field(field).column)
+            for field in fields
+        )
+
+    def conflict_clause(self):
+        unique = self.columns(self.unique_fields)
+        if not self.update_fields:
+            return f'ON CONFLICT ({unique}) DO NOTHING'
+        columns = [
+            self.quote(self.model._meta.get_field(field).column)
+            for field in self.update_fields
+        ]
+        assignments = ', '.join(
+            f'{column} = excluded.{column}' for column in columns
+        )
+        changed = ' OR '.join(
+            f'{self.table}.{column} {self.distinct_operator} '
+            f'excluded.{column}'
+            for column in columns
+        )
+        return (
+            f'ON CONFLICT ({unique}) DO UPDATE SET {assignments} '
+            f'WHERE {changed}'
+        )
+
+    def prepare(self, row):
+        return tuple(
+            field.get_db_prep_save(
+                field.to_python(row[field.name]), self.connection
+            )
+            for field in self.model_fields
+        )
+
+    def __call__(self, rows):
+        rows = map(self.prepare, rows)
+        if self.copy:
+            return self.copy_merge(rows)
+        return self.batch_insert(rows)
+
+    def copy_merge(self, rows):
+        columns = self.columns(self.fields)
+        unique = self.columns(self.unique_fields)
+        staging = self.quote(f'{self.model._meta.db_table}_import')
+        with self.connection.cursor() as cursor:
+            cursor.execute(
+                f'CREATE TEMPORARY TABLE {staging} ON COMMIT DROP AS '
+                f'SELECT {columns} FROM {self.table} WITH NO DATA'
+            )
+            cursor.copy_expert(
+                f'COPY {staging} ({columns}) FROM STDIN WITH (FORMAT csv)',
+                CSVStream(rows)
+            )
+            cursor.execute(f'SELECT COUNT(*) FROM {staging}')
+            total, = cursor.fetchone()
+            # Из повторов ключа в файле остаётся последний.
+            cursor.execute(
+                f'WITH merged AS ('
+                f'INSERT INTO {self.table} ({columns}) '
+                f'SELECT DISTINCT ON ({unique}) {columns} FROM {staging} '
+                f'ORDER BY {unique}, ctid DESC '
+                f'{self.conflict_clause()} '
+                f'RETURNING xmax = 0 AS inserted) '
+                f'SELECT COUNT(*) FILTER (WHERE inserted), '
+                f'COUNT(*) FILTER (WHERE NOT inserted) FROM merged'
+            )
+            inserted, updated = cursor.fetchone()
+            cursor.execute(f'DROP TABLE {staging}')
+        return ImportResult(inserted, updated, total - inserted - updated)
+
+    def batch_insert(self, rows):
+        columns = self.columns(self.fields)
+        unique = self.columns(self.unique_fields)
+        unique_count = len(self.unique_fields)
+        row_placeholder = '({})'.format(', '.join(['%s'] * len(self.fields)))
+        key_placeholder = '({})'.format(', '.join(['%s'] * unique_count))
+        inserted = updated = skipped = 0
+        with self.connection.cursor() as cursor:
+            for batch in batches(rows, self.batch_size):
+                # Повтор ключа в одной пачке заменяет предыдущую строку.
+                unique_rows = {row[:unique_count]: row for row in batch}
+                skipped += len(batch) - len(unique_rows)
+                keys = ', '.join([key_placeholder] * len(unique_rows))
+                cursor.execute(
+                    f'SELECT COUNT(*) FROM {self.table} '
+                    f'WHERE ({unique}) IN (VALUES {keys})',
+                    [value for key in unique_rows for value in key]
+                )
+                existing, = cursor.fetchone()
+                values = ', '.join([row_placeholder] * len(unique_rows))
+                cursor.execute(
+                    f'INSERT INTO {self.table} ({columns}) VALUES {values} '
+                    f'{self.conflict_clause()}',
+                    [value for row in unique_rows.values() for value in row]
+                )
+                batch_inserted = len(unique_rows) - existing
+                inserted += batch_inserted
+                updated += cursor.rowcount - batch_inserted
+                skipped += existing - (cursor.rowcount - batch_inserted)
+        return ImportResult(inserted, updated, skipped)
+
+
+def import_catalogue(model, path, fields, unique_fields, update_fields=(),
+                     force=False, using=DEFAULT_DB_ALIAS,
+                     batch_size=BATCH_SIZE):
+    """Импортирует файл в каталог model.
+
+    Возвращает None, если файл не менялся с прошлого импорта (и не
+    передан force), иначе ImportResult.
+    """
+    source = f'{model._meta.label}:{os.path.basename(path)}'
+    checksum = file_checksum(path)
+    with transaction.atomic(using=using):
+        imports = CatalogueImport.objects.using(using)
+        if not force and imports.filter(
+            source=source, checksum=checksum
+        ).exists():
+            return None
+        result = Upsert(
+            model, unique_fields, update_fields, using, batch_size
+        )(read_rows(path, fields))
+        imports.update_or_create(
+            source=source, defaults={'checksum': checksum}
+        )
+        if result.inserted or result.updated:
+            catalogue_imported.send(
+                sender=model, result=result, using=using
+            )
+    return result
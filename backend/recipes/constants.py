@@ -7,3 +7,4 @@ MAX_INGREDIENT_NAME_LENGTH = 128
 MIN_AMOUNT_INGREDIENT = 1
 MAX_MEASUREMENT_UNIT_LENGTH = 64
 COOK_TIME_MIN = 1
+MAX_IMPORT_SOURCE_LENGTH = 255
@@ -0,0 +1,49 @@
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from recipes.models import Favorite, Recipe, ShoppingCart, Subscription, User
+
+# Хранимый счётчик: (модель, поле, модель связи, внешний ключ связи).
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'shopping_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+    (User, 'subscriptions_count', Subscription, 'user'),
+)
+
+
+def change_counters(instance, delta, using):
+    """Атомарно сдвигает счётчики, которые считают instance, на delta."""
+    for model, field, related_model, foreign_key in COUNTERS:
+        if not isinstance(instance, related_model):
+            continue
+        counted = model.objects.using(using).filter(
+            pk=getattr(instance, f'{foreign_key}_id')
+        )
+        if delta < 0:
+            counted = counted.filter(**{f'{field}__gte': -delta})
+        counted.update(**{field: F(field) + delta})
+
+
+def actual_count(related_model, foreign_key):
+    return Coalesce(Subquery(
+        related_model.objects.filter(
+            **{foreign_key: OuterRef('pk')}
+        ).order_by().values(foreign_key).annotate(
+            count=Count('*')
+        ).values('count')
+    ), Value(0))
+
+
+def recount_counters(dry_run=False):
+    """Исправляет разошедшиеся счётчики. Возвращает {поле: исправлено}."""
+    repaired = {}
+    for model, field, related_model, foreign_key in COUNTERS:
+        expected = actual_count(related_model, foreign_key)
+        drifted = model.objects.exclude(**{field: expected})
+        repaired[f'{model.__name__}.{field}'] = (
+            drifted.count() if dry_run
+            else drifted.update(**{field: expected})
+        )
+    return repaired
@@ -0,0 +1,70 @@
+import hashlib
+import re
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Count, F, IntegerField, Max, Min, Subquery
+from django.db.models.expressions import ExpressionWrapper
+
+COOKING_TIME_BUCKETS = 3
+RANGE_PATTERN = re.compile(r'^(\d+)-(\d+)$')
+
+
+def cooking_time_histogram(queryset, buckets=COOKING_TIME_BUCKETS):
+    """Делит время готовки на равные диапазоны между минимумом и
+    максимумом и считает рецепты в каждом одним запросом.
+
+    Возвращает список (нижняя граница, верхняя граница, количество),
+    границы включительно. Результат ненадолго кэшируется.
+    """
+    queryset = queryset.order_by()
+    sql, params = queryset.values('pk').query.sql_with_params()
+    key = 'cooking-time-histogram:' + hashlib.md5(
+        repr((buckets, sql, params)).encode()
+    ).hexdigest()
+    histogram = cache.get(key)
+    if histogram is None:
+        histogram = build_histogram(queryset, buckets)
+        cache.set(
+            key, histogram, settings.COOKING_TIME_HISTOGRAM_CACHE_TIMEOUT
+        )
+    return histogram
+
+
+def build_histogram(queryset, buckets):
+    lowest = Subquery(
+        queryset.order_by('cooking_time').values('cooking_time')[:1]
+    )
+    highest = Subquery(
+        queryset.order_by('-cooking_time').values('cooking_time')[:1]
+    )
+    rows = list(queryset.annotate(bucket=ExpressionWrapper(
+        (F('cooking_time') - lowest) * buckets / (highest - lowest + 1),
+        output_field=IntegerField()
+    )).values('bucket').annotate(
+        count=Count('pk'),
+        lowest=Min('cooking_time'),
+        highest=Max('cooking_time'),
+    ).order_by('bucket'))
+    if not rows:
+        return []
+    lowest = rows[0]['lowest']
+    span = rows[-1]['highest'] - lowest + 1
+    counts = {row['bucket']: row['count'] for row in rows}
+    histogram = []
+    for bucket in range(buckets):
+        # Те же границы, что у целочисленного деления в запросе.
+        lower = lowest - (-bucket * span // buckets)
+        upper = lowest - (-(bucket + 1) * span // buckets) - 1
+        if lower <= upper:
+            histogram.append((lower, upper, counts.get(bucket, 0)))
+    return histogram
+
+
+def parse_range(value):
+    """'10-30' -> (10, 30); None для некорректного значения."""
+    match = RANGE_PATTERN.match(value or '')
+    if not match:
+        return None
+    lower, upper = map(int, match.groups())
+    return (lower, upper) if lower <= upper else None
@@ -0,0 +1,115 @@
+import os
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+
+# Имя: (размер, обрезать до пропорций размера).
+RENDITIONS = {
+    'thumbnail': ((160, 160), True),
+    'card': ((640, 480), True),
+    'full': ((1600, 1600), False),
+}
+FORMATS = {
+    'jpeg': ('jpg', {'quality': 85, 'optimize': True, 'progressive': True}),
+    'webp': ('webp', {'quality': 80, 'method': 4}),
+}
+
+
+def rendition_name(name, rendition, format):
+    """recipes/abc.png -> recipes/abc.thumbnail.webp"""
+    root, _ = os.path.splitext(name)
+    return f'{root}.{rendition}.{FORMATS[format][0]}'
+
+
+def rendition_names(name):
+    return [
+        rendition_name(name, rendition, format)
+        for rendition in RENDITIONS for format in FORMATS
+    ]
+
+
+# Pillow импортируется при первой обработке изображения: воркерам,
+# которые только отдают ссылки на готовые копии, он не нужен.
+def open_image(field_file):
+    from PIL import Image, ImageOps
+
+    with field_file.storage.open(field_file.name) as file:
+        image = ImageOps.exif_transpose(Image.open(file))
+        image.load()
+    if image.mode in ('RGBA', 'LA') or 'transparency' in image.info:
+        image = image.convert('RGBA')
+        background = Image.new('RGB', image.size, 'white')
+        background.paste(image, mask=image.getchannel('A'))
+        return background
+    return image.convert('RGB')
+
+
+def resize(image, size, crop):
+    from PIL import Image, ImageOps
+
+    if crop:
+        return ImageOps.fit(image, size, Image.LANCZOS)
+    image = image.copy()
+    image.thumbnail(size, Image.LANCZOS)
+    return image
+
+
+def generate_renditions(field_file, force=False):
+    """Создаёт недостающие варианты изображения рядом с оригиналом.
+
+    Возвращает количество созданных файлов. Файл, который Pillow не может
+    прочитать, пропускается.
+    """
+    if not field_file:
+        return 0
+    storage = field_file.storage
+    missing = {
+        (rendition, format): rendition_name(field_file.name, rendition, format)
+        for rendition in RENDITIONS for format in FORMATS
+    }
+    if not force:
+        missing = {
+            key: name for key, name in missing.items()
+            if not storage.exists(name)
+        }
+    if not missing:
+        return 0
+    from PIL import Image
+
+    try:
+        image = open_image(field_file)
+    except (OSError, Image.DecompressionBombError):
+        return 0
+    resized = {}
+    for (rendition, format), name in missing.items():
+        if rendition not in resized:
+            resized[rendition] = resize(image, *RENDITIONS[rendition])
+        buffer = BytesIO()
+        resized[rendition].save(buffer, format, **FORMATS[format][1])
+        save_derived(storage, name, ContentFile(buffer.getvalue()))
+    return len(missing)
+
+
+def save_derived(storage, name, content):
+    if hasattr(storage, 'save_derived'):
+        return storage.save_derived(name, content)
+    if storage.exists(name):
+        storage.delete(name)
+    return storage.save(name, content)
+
+
+def rendition_urls(field_file):
+    """Ссылки на копии по размерам и форматам. Вместо ссылки на ещё
+    не созданную копию - None."""
+    if not field_file:
+        return None
+    storage = field_file.storage
+    urls = {}
+    for rendition in RENDITIONS:
+        urls[rendition] = {}
+        for format in FORMATS:
+            name = rendition_name(field_file.name, rendition, format)
+            urls[rendition][format] = (
+                storage.url(name) if storage.exists(name) else None
+            )
+    return urls
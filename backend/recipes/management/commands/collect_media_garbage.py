@@ -0,0 +1,76 @@
+import os
+import time
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.images import RENDITIONS
+from recipes.storage import INCOMING_DIR
+
+
+def file_stem(name):
+    """recipes/ab/abc.thumbnail.webp и recipes/ab/abc.jpg -> recipes/ab/abc"""
+    root, _ = os.path.splitext(name)
+    base, rendition = os.path.splitext(root)
+    return base if rendition[1:] in RENDITIONS else root
+
+
+def walk_files(path):
+    """Обходит дерево через os.scandir, не собирая список файлов."""
+    with os.scandir(path) as entries:
+        for entry in entries:
+            if entry.is_dir(follow_symlinks=False):
+                yield from walk_files(entry.path)
+            elif entry.is_file(follow_symlinks=False):
+                yield entry
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаляет из MEDIA_ROOT файлы, на которые не ссылается ни одна '
+        'модель, вместе с их уменьшенными копиями.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true')
+        parser.add_argument(
+            '--min-age', type=int, default=3600,
+            help='Не трогать файлы моложе указанного числа секунд.'
+        )
+
+    def handle(self, *args, dry_run=False, min_age=3600, **kwargs):
+        if not hasattr(default_storage, 'file_fields'):
+            raise CommandError(
+                'Хранилище по умолчанию не ContentAddressedStorage.'
+            )
+        referenced = {
+            file_stem(name)
+            for model, field in default_storage.file_fields()
+            for name in model._default_manager.exclude(
+                **{field.name: ''}
+            ).values_list(field.name, flat=True).iterator()
+            if name
+        }
+        location = default_storage.location
+        if not os.path.isdir(location):
+            return
+        deadline = time.time() - min_age
+        files = removed = freed = 0
+        for entry in walk_files(location):
+            files += 1
+            name = os.path.relpath(entry.path, location).replace(os.sep, '/')
+            stat = entry.stat(follow_symlinks=False)
+            if stat.st_mtime > deadline or (
+                not name.startswith(f'{INCOMING_DIR}/')
+                and file_stem(name) in referenced
+            ):
+                continue
+            removed += 1
+            freed += stat.st_size
+            if not dry_run:
+                os.remove(entry.path)
+        self.stdout.write(
+            f'Файлов: {files}, '
+            f'{"к удалению" if dry_run else "удалено"}: {removed}, '
+            f'{freed / 1024 / 1024:.1f} МБ'
+        )
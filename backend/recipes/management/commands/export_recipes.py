@@ -0,0 +1,35 @@
+import tarfile
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import BATCH_SIZE, export_recipes, open_lines
+
+
+class Command(BaseCommand):
+    help = (
+        'Выгружает рецепты с продуктами, тэгами и авторами в JSON Lines '
+        '(.gz - со сжатием), изображения - в tar-архив.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .jsonl или .jsonl.gz.')
+        parser.add_argument(
+            '--media', help='tar-архив для изображений рецептов.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, path, media=None, batch_size=BATCH_SIZE, **kwargs):
+        start = perf_counter()
+        archive = tarfile.open(media, 'w') if media else None
+        try:
+            with open_lines(path, 'w') as file:
+                count = export_recipes(file, archive, batch_size=batch_size)
+        finally:
+            if archive is not None:
+                archive.close()
+        elapsed = perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Выгружено рецептов: {count} за {elapsed:.1f} с '
+            f'({count / elapsed:.0f} рецептов/с).'
+        ))
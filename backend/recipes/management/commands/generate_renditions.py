@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from recipes.images import generate_renditions
+from recipes.models import Recipe, User
+
+
+class Command(BaseCommand):
+    help = (
+        'Создаёт уменьшенные копии (thumbnail, card, full в JPEG и WebP) '
+        'для уже загруженных изображений рецептов и аватаров.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Пересоздать существующие копии.'
+        )
+
+    def handle(self, *args, force=False, **kwargs):
+        for model, field_name in ((Recipe, 'image'), (User, 'avatar')):
+            names = model.objects.exclude(
+                **{field_name: ''}
+            ).exclude(
+                **{f'{field_name}__isnull': True}
+            ).values_list(field_name, flat=True).distinct().order_by()
+            field = model._meta.get_field(field_name)
+            images = created = 0
+            for name in names.iterator():
+                images += 1
+                created += generate_renditions(
+                    field.attr_class(None, field, name), force
+                )
+            self.stdout.write(
+                f'{model._meta.verbose_name_plural}: изображений {images}, '
+                f'создано файлов {created}'
+            )
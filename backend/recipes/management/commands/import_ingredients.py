@@ -3,7 +3,8 @@ from recipes.models import Ingredient
 
 
 class Command(BaseImportCommand):
-    help = 'Импортирует ингредиенты из файла ingredients.json'
-
-    def handle(self, *args, **kwargs):
-        return self.import_from_json(Ingredient, 'ingredients.json')
+    help = 'Импортирует ингредиенты из файла ingredients.csv'
+    model = Ingredient
+    file_name = 'ingredients.csv'
+    fields = ('name', 'measurement_unit')
+    unique_fields = ('name', 'measurement_unit')
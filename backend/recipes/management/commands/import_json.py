@@ -1,43 +1,67 @@
-import json
 import os
+from time import perf_counter
 
 from django.conf import settings
 from django.core.management.base import BaseCommand
 from django.db import IntegrityError
 
+from recipes.catalogue import BATCH_SIZE, import_catalogue
+
 
 class BaseImportCommand(BaseCommand):
+    """Импорт каталога из CSV, JSON Lines или JSON-массива.
+
+    Повторный запуск с тем же файлом ничего не делает, изменённый файл
+    добавляет новые записи и обновляет update_fields существующих.
+    """
+    model = None
+    file_name = None
+    fields = ()
+    unique_fields = ()
+    update_fields = ()
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', nargs='?',
+            default=os.path.join(settings.BASE_DIR, 'data', self.file_name),
+            help='Файл .csv, .jsonl или .json.'
+        )
+        parser.add_argument(
+            '--force', action='store_true',
+            help='Импортировать, даже если файл не менялся.'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
 
     def handle_import_result(self, success, message):
         style = self.style.SUCCESS if success else self.style.ERROR
         return self.stdout.write(style(message))
 
-    def import_from_json(self, model, file_name):
-        file_path = os.path.join(settings.BASE_DIR, 'data', file_name)
+    def handle(self, path, force, batch_size, **kwargs):
+        start = perf_counter()
         try:
-            with open(file_path, 'r', encoding='utf-8') as file:
-                data = json.load(file)
-                model.objects.bulk_create(
-                    [model(**item) for item in data],
-                    ignore_conflicts=True
-                )
-                return self.handle_import_result(
-                    True,
-                    f'{model.__name__}s успешно добавленны. '
-                    f'Количество импортированных: {len(data)}',
-                )
-        except IntegrityError:
-            return self.handle_import_result(
-                False,
-                f'Такой {model.__name__} уже существует в базе.'
+            result = import_catalogue(
+                self.model, path, self.fields, self.unique_fields,
+                self.update_fields, force=force, batch_size=batch_size
             )
         except FileNotFoundError:
             return self.handle_import_result(
-                False, f'Файл {file_path} не найден'
+                False, f'Файл {path} не найден'
+            )
+        except ValueError as error:
+            return self.handle_import_result(
+                False, f'Ошибка чтения {path}: {error}'
+            )
+        except IntegrityError as error:
+            return self.handle_import_result(
+                False, f'Ошибка записи {self.model.__name__}: {error}'
             )
-        except json.JSONDecodeError:
+        if result is None:
             return self.handle_import_result(
-                False, 'Ошибка чтения JSON. Проверьте формат файла.'
+                True, f'Файл {path} не менялся с прошлого импорта.'
             )
-        except Exception as e:
-            return self.handle_import_result(False, f'Ошибка: {e}')
+        return self.handle_import_result(
+            True,
+            f'{self.model.__name__}: добавлено {result.inserted}, '
+            f'обновлено {result.updated}, без изменений {result.skipped} '
+            f'за {perf_counter() - start:.2f} с.'
+        )
@@ -0,0 +1,52 @@
+import os
+import tarfile
+from time import perf_counter
+
+from django.core.management.base import BaseCommand
+
+from recipes.transfer import (
+    BATCH_SIZE, RecipeImporter, import_images, open_lines, read_records
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Загружает рецепты, выгруженные export_recipes. Рецепты, которые '
+        'уже есть у автора, пропускаются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='Файл .jsonl или .jsonl.gz.')
+        parser.add_argument(
+            '--media', help='tar-архив с изображениями рецептов.'
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help='Процессов для записи изображений и их уменьшенных копий '
+                 '(0 - по числу ядер).'
+        )
+        parser.add_argument('--batch-size', type=int, default=BATCH_SIZE)
+
+    def handle(self, path, media=None, workers=1, batch_size=BATCH_SIZE,
+               **kwargs):
+        image_names = {}
+        if media:
+            start = perf_counter()
+            with tarfile.open(media) as archive:
+                image_names = import_images(
+                    archive, workers or os.cpu_count()
+                )
+            self.stdout.write(
+                f'Изображений: {len(image_names)} за '
+                f'{perf_counter() - start:.1f} с.'
+            )
+        start = perf_counter()
+        importer = RecipeImporter(image_names, batch_size)
+        with open_lines(path, 'r') as file:
+            importer.run(read_records(file))
+        elapsed = perf_counter() - start
+        self.stdout.write(self.style.SUCCESS(
+            f'Загружено рецептов: {importer.imported}, пропущено: '
+            f'{importer.skipped} за {elapsed:.1f} с '
+            f'({importer.imported / elapsed:.0f} рецептов/с).'
+        ))
@@ -4,6 +4,8 @@ from recipes.models import Tag
 
 class Command(BaseImportCommand):
     help = 'Импортирует теги из файла mytags.json'
-
-    def handle(self, *args, **kwargs):
-        return self.import_from_json(Tag, 'mytags.json')
+    model = Tag
+    file_name = 'mytags.json'
+    fields = ('name', 'slug')
+    unique_fields = ('slug',)
+    update_fields = ('name',)
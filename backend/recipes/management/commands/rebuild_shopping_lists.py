@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from recipes.models import ShoppingListItem
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересобирает списки покупок из корзин. С --check только сверяет '
+        'сохранённые суммы с полным пересчётом.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true')
+        parser.add_argument(
+            '--user', type=int, nargs='+', dest='user_ids',
+            help='Ограничить пользователями с указанными id.'
+        )
+
+    def handle(self, *args, check=False, user_ids=None, **kwargs):
+        if not check:
+            ShoppingListItem.objects.rebuild(user_ids)
+            return self.stdout.write(self.style.SUCCESS(
+                'Списки покупок пересобраны.'
+            ))
+        items = ShoppingListItem.objects.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        fields = ('user_id', 'ingredient_id', 'amount')
+        stored = set(items.values_list(*fields).iterator())
+        expected = {
+            tuple(item[field] for field in fields)
+            for item in ShoppingListItem.objects.from_carts(
+                user_ids
+            ).iterator()
+        }
+        users = {item[0] for item in stored ^ expected}
+        if users:
+            raise CommandError(
+                f'Расхождения в списках покупок пользователей: '
+                f'{", ".join(map(str, sorted(users)))}'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            'Списки покупок совпадают с корзинами.'
+        ))
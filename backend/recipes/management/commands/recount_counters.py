@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from recipes.counters import recount_counters
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет хранимые счётчики избранного, корзин, рецептов и '
+        'подписок с таблицами связей и исправляет расхождения.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--dry-run', action='store_true',
+            help='Только показать количество расхождений.'
+        )
+
+    def handle(self, *args, dry_run=False, **kwargs):
+        for counter, count in recount_counters(dry_run).items():
+            self.stdout.write(
+                f'{counter}: '
+                f'{"расхождений" if dry_run else "исправлено"} {count}'
+            )
@@ -0,0 +1,20 @@
+# Generated by Django 3.2.3 on 2026-10-17 21:10
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0005_recipe_created_at_id_idx'),
+    ]
+
+    operations = [
+        # Фильтр по тэгам идёт полусоединением от тэга к рецептам,
+        # автоматическая таблица связи такого индекса не имеет.
+        migrations.RunSQL(
+            'CREATE INDEX recipe_tags_tag_recipe_idx '
+            'ON recipes_recipe_tags (tag_id, recipe_id);',
+            'DROP INDEX recipe_tags_tag_recipe_idx;',
+        ),
+    ]
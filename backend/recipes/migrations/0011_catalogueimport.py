@@ -0,0 +1,26 @@
+# Generated by Django 3.2.3 on 2026-10-18 02:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_counters'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='CatalogueImport',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=255, unique=True, verbose_name='Источник')),
+                ('checksum', models.CharField(max_length=64, verbose_name='SHA-256 файла')),
+                ('imported_at', models.DateTimeField(auto_now=True, verbose_name='Импортирован')),
+            ],
+            options={
+                'verbose_name': 'Импорт каталога',
+                'verbose_name_plural': 'Импорты каталога',
+            },
+        ),
+    ]
@@ -1,6 +1,7 @@
 ﻿from django.contrib.auth.models import AbstractUser
 from django.core.validators import MinValueValidator
-from django.db import models
+from django.db import connections, models, transaction
+from django.db.models import F, Sum
 
 import recipes.constants as const
 from recipes.validators import validate_username
@@ -34,6 +35,21 @@ class User(AbstractUser):
         blank=True,
         verbose_name='Аватар'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Рецептов'
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписчиков'
+    )
+    subscriptions_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='Подписок'
+    )
 
     class Meta:
         ordering = ('username',)
@@ -45,15 +61,15 @@ class User(AbstractUser):
 
     @property
     def number_of_recipes(self):
-        return self.recipes.count()
+        return self.recipes_count
 
     @property
     def number_of_subscriptions(self):
-        return self.authors.count()
+        return self.subscriptions_count
 
     @property
     def number_of_subscribers(self):
-        return self.subscribers.count()
+        return self.subscribers_count
 
 
 class Subscription(models.Model):
@@ -175,12 +191,36 @@ class Recipe(models.Model):
         blank=True,
         verbose_name='Создан'
     )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Изменён'
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В избранном'
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        default=0,
+        editable=False,
+        verbose_name='В списках покупок'
+    )
 
     class Meta:
         default_related_name = 'recipes'
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ('-created_at',)
+        indexes = [
+            models.Index(
+                fields=['-created_at', '-id'],
+                name='recipe_created_at_id_idx'
+            ),
+            models.Index(
+                fields=['-favorites_count', '-id'],
+                name='recipe_favorites_count_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name[:const.MAX_STR_LENGTH]
@@ -267,3 +307,149 @@ class Favorite(UserRecipeBaseModel):
     class Meta(UserRecipeBaseModel.Meta):
         verbose_name = 'В избранном'
         verbose_name_plural = 'В избранных'
+
+
+class ShoppingListItemManager(models.Manager):
+
+    @transaction.atomic
+    def change_recipe(self, recipe_id, sign, user_id=None):
+        """Прибавляет (sign=1) или вычитает (sign=-1) продукты рецепта
+        в списках покупок всех пользователей, у которых он в корзине."""
+        table = self.model._meta.db_table
+        cart_table = ShoppingCart._meta.db_table
+        recipe_ingredient_table = RecipeIngredient._meta.db_table
+        params = [sign, recipe_id]
+        user_condition = ''
+        if user_id is not None:
+            user_condition = 'AND cart.user_id = %s'
+            params.append(user_id)
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                f'SELECT cart.user_id, item.ingredient_id, %s * item.amount '
+                f'FROM {cart_table} cart '
+                f'JOIN {recipe_ingredient_table} item '
+                f'ON item.recipe_id = cart.recipe_id '
+                f'WHERE cart.recipe_id = %s {user_condition} '
+                f'ON CONFLICT (user_id, ingredient_id) '
+                f'DO UPDATE SET amount = {table}.amount + excluded.amount',
+                params
+            )
+        if sign < 0:
+            items = self.filter(amount__lte=0)
+            items = (
+                items.filter(user_id=user_id) if user_id is not None
+                else items.filter(user__shoppingcarts__recipe_id=recipe_id)
+            )
+            items.delete()
+
+    @transaction.atomic
+    def change_ingredients(self, recipe_id, deltas):
+        """Сдвигает меры отдельных продуктов рецепта в списках покупок
+        всех, у кого он в корзине. deltas - {id продукта: изменение}."""
+        deltas = {id: delta for id, delta in deltas.items() if delta}
+        if not deltas:
+            return
+        table = self.model._meta.db_table
+        cart_table = ShoppingCart._meta.db_table
+        values = ', '.join(['(%s, %s)'] * len(deltas))
+        with connections[self.db].cursor() as cursor:
+            cursor.execute(
+                f'INSERT INTO {table} (user_id, ingredient_id, amount) '
+                f'SELECT cart.user_id, delta.column1, delta.column2 '
+                f'FROM {cart_table} cart CROSS JOIN (VALUES {values}) delta '
+                f'WHERE cart.recipe_id = %s '
+                f'ON CONFLICT (user_id, ingredient_id) '
+                f'DO UPDATE SET amount = {table}.amount + excluded.amount',
+                [*(value for item in deltas.items() for value in item),
+                 recipe_id]
+            )
+        self.filter(
+            amount__lte=0,
+            ingredient_id__in=deltas,
+            user__shoppingcarts__recipe_id=recipe_id
+        ).delete()
+
+    def from_carts(self, user_ids=None):
+        """Полный пересчёт: суммы продуктов по корзинам пользователей."""
+        carts = ShoppingCart.objects.using(self.db).filter(
+            recipe__recipeingredients__isnull=False
+        )
+        if user_ids is not None:
+            carts = carts.filter(user_id__in=user_ids)
+        return carts.values(
+            'user_id',
+            ingredient_id=F('recipe__recipeingredients__ingredient_id'),
+        ).annotate(
+            amount=Sum('recipe__recipeingredients__amount')
+        ).order_by()
+
+    @transaction.atomic
+    def rebuild(self, user_ids=None):
+        items = self.all()
+        if user_ids is not None:
+            items = items.filter(user_id__in=user_ids)
+        items.delete()
+        self.bulk_create(
+            (
+                self.model(**item)
+                for item in self.from_carts(user_ids).iterator()
+            ),
+            batch_size=1000
+        )
+
+    def add_recipe(self, recipe_id, user_id=None):
+        self.change_recipe(recipe_id, 1, user_id)
+
+    def remove_recipe(self, recipe_id, user_id=None):
+        self.change_recipe(recipe_id, -1, user_id)
+
+
+class ShoppingListItem(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        verbose_name='Продукт'
+    )
+    amount = models.IntegerField(verbose_name='Мера')
+
+    objects = ShoppingListItemManager()
+
+    class Meta:
+        default_related_name = 'shoppinglistitems'
+        constraints = [
+            models.UniqueConstraint(
+                name='unique_shopping_list_item',
+                fields=['user', 'ingredient']
+            )
+        ]
+        verbose_name = 'Продукт в списке покупок'
+        verbose_name_plural = 'Продукты в списках покупок'
+
+    def __str__(self):
+        return f'{self.ingredient} ({self.amount}) у {self.user}'
+
+
+class CatalogueImport(models.Model):
+    source = models.CharField(
+        max_length=const.MAX_IMPORT_SOURCE_LENGTH,
+        unique=True,
+        verbose_name='Источник'
+    )
+    checksum = models.CharField(max_length=64, verbose_name='SHA-256 файла')
+    imported_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Импортирован'
+    )
+
+    class Meta:
+        verbose_name = 'Импорт каталога'
+        verbose_name_plural = 'Импорты каталога'
+
+    def __str__(self):
+        return self.source
@@ -0,0 +1,63 @@
+from django.conf import settings
+from django.core.paginator import EmptyPage, PageNotAnInteger, Paginator
+from django.db import connections
+from django.utils.functional import cached_property
+
+
+def estimate_count(queryset):
+    """Оценка числа строк в таблице по статистике планировщика PostgreSQL.
+
+    Возвращает None для других СУБД и для отфильтрованных выборок.
+    """
+    query = queryset.query
+    connection = connections[queryset.db]
+    if (
+        connection.vendor != 'postgresql' or query.where or query.distinct
+        or query.is_sliced
+    ):
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass',
+            [queryset.model._meta.db_table]
+        )
+        row = cursor.fetchone()
+    return row[0] if row and row[0] >= 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator, который для больших таблиц без фильтров берёт оценку
+    количества строк вместо COUNT(*)."""
+    estimate_threshold = settings.PAGINATION_COUNT_ESTIMATE_THRESHOLD
+    count_exact = True
+
+    @cached_property
+    def count(self):
+        estimate = estimate_count(self.object_list)
+        if estimate is not None and estimate > self.estimate_threshold:
+            self.count_exact = False
+            return estimate
+        return self.get_exact_count()
+
+    def get_exact_count(self):
+        return self.object_list.count()
+
+    def validate_number(self, number):
+        if self.count_exact:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger('Номер страницы не является целым числом')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        if self.count_exact:
+            return super().page(number)
+        bottom = (number - 1) * self.per_page
+        return self._get_page(
+            self.object_list[bottom:bottom + self.per_page], number, self
+        )
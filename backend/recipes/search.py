@@ -0,0 +1,81 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+SEARCH_CONFIG = 'russian'
+FTS_TABLE = 'recipes_recipe_fts'
+
+
+def search_recipes(queryset, text):
+    """Полнотекстовый поиск рецептов по названию и описанию.
+
+    В PostgreSQL используется столбец search_vector с GIN-индексом,
+    в SQLite - таблица FTS5. Результаты упорядочены по релевантности.
+    """
+    terms = re.findall(r'\w+', text.lower())
+    if not terms:
+        return queryset
+    table = queryset.model._meta.db_table
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        ts_query = f"websearch_to_tsquery('{SEARCH_CONFIG}', %s)"
+        queryset = queryset.filter(RawSQL(
+            f'"{table}"."search_vector" @@ {ts_query}',
+            (text,),
+            output_field=BooleanField()
+        )).annotate(search_rank=RawSQL(
+            f'ts_rank("{table}"."search_vector", {ts_query})',
+            (text,),
+            output_field=FloatField()
+        ))
+    elif vendor == 'sqlite':
+        match = ' '.join(f'"{term}"*' for term in terms)
+        queryset = queryset.filter(id__in=RawSQL(
+            f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s',
+            (match,)
+        )).annotate(search_rank=RawSQL(
+            f'SELECT -bm25({FTS_TABLE}, 10.0, 1.0) FROM {FTS_TABLE} '
+            f'WHERE {FTS_TABLE} MATCH %s AND rowid = "{table}"."id"',
+            (match,),
+            output_field=FloatField()
+        ))
+    else:
+        condition = Q()
+        for term in terms:
+            condition &= Q(name__icontains=term) | Q(text__icontains=term)
+        return queryset.filter(condition)
+    return queryset.order_by('-search_rank', '-created_at')
+
+
+def update_search_index(recipe, using, deleted=False):
+    """Синхронизирует FTS5 с рецептом. В PostgreSQL search_vector -
+    генерируемый столбец и обновляется самой базой."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {FTS_TABLE} WHERE rowid = %s', [recipe.pk]
+        )
+        if not deleted:
+            cursor.execute(
+                f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+                'VALUES (%s, %s, %s)',
+                [recipe.pk, recipe.name, recipe.text]
+            )
+
+
+def index_recipes(recipe_ids, using):
+    """Добавляет в FTS5 рецепты, вставленные bulk_create без post_save."""
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {FTS_TABLE} (rowid, name, text) '
+            f'SELECT id, name, text FROM recipes_recipe '
+            f'WHERE id IN ({", ".join(["%s"] * len(recipe_ids))})',
+            recipe_ids
+        )
@@ -0,0 +1,99 @@
+from collections import OrderedDict
+from string import ascii_letters
+from threading import Lock
+from time import monotonic
+
+from django.conf import settings
+
+from api.cache import SHORT_LINKS, get_version
+from recipes.models import Recipe
+
+# Только буквы: коды не пересекаются со старыми ссылками вида /s/<id>/.
+ALPHABET = ascii_letters
+BASE = len(ALPHABET)
+INDEXES = {letter: index for index, letter in enumerate(ALPHABET)}
+
+
+def encode(recipe_id):
+    code = ''
+    while True:
+        recipe_id, remainder = divmod(recipe_id, BASE)
+        code = ALPHABET[remainder] + code
+        if not recipe_id:
+            return code
+
+
+def decode(code):
+    """id рецепта по коду или None, если код некорректен."""
+    recipe_id = 0
+    for letter in code:
+        index = INDEXES.get(letter)
+        if index is None:
+            return None
+        recipe_id = recipe_id * BASE + index
+    return recipe_id if code and encode(recipe_id) == code else None
+
+
+class ShortLinkResolver:
+    """Проверяет существование рецептов для коротких ссылок.
+
+    Найденные id хранятся в LRU в памяти процесса, ненайденные - с
+    коротким сроком, чтобы перебор несуществующих кодов не доходил
+    до базы. Запись действительна, пока не изменилась общая для всех
+    воркеров версия SHORT_LINKS: её меняют создание и удаление рецептов.
+    """
+
+    def __init__(self, size=settings.SHORT_LINK_CACHE_SIZE,
+                 timeout=settings.SHORT_LINK_CACHE_TIMEOUT,
+                 missing_timeout=settings.SHORT_LINK_MISSING_CACHE_TIMEOUT):
+        self.size = size
+        self.timeout = timeout
+        self.missing_timeout = missing_timeout
+        self.lock = Lock()
+        self.entries = OrderedDict()
+
+    def cached(self, recipe_id, version=None):
+        """Ответ из кэша без обращения к базе или None, если его нет."""
+        if version is None:
+            version = get_version(SHORT_LINKS)
+        with self.lock:
+            entry = self.entries.get(recipe_id)
+            if (
+                entry is None or entry[1] <= monotonic()
+                or entry[2] != version
+            ):
+                return None
+            self.entries.move_to_end(recipe_id)
+            return entry[0]
+
+    def exists(self, recipe_id):
+        # Версия читается до запроса: изменение во время запроса
+        # не сохранится под новой версией.
+        version = get_version(SHORT_LINKS)
+        found = self.cached(recipe_id, version)
+        if found is not None:
+            return found
+        found = Recipe.objects.filter(id=recipe_id).exists()
+        expires = monotonic() + (
+            self.timeout if found else self.missing_timeout
+        )
+        with self.lock:
+            self.entries[recipe_id] = (found, expires, version)
+            self.entries.move_to_end(recipe_id)
+            while len(self.entries) > self.size:
+                self.entries.popitem(last=False)
+        return found
+
+    def resolve(self, code):
+        """id рецепта по коду, если такой рецепт есть, иначе None."""
+        recipe_id = decode(code)
+        if recipe_id is None or not self.exists(recipe_id):
+            return None
+        return recipe_id
+
+    def discard(self, recipe_id):
+        with self.lock:
+            self.entries.pop(recipe_id, None)
+
+
+short_links = ShortLinkResolver()
@@ -0,0 +1,86 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+
+from recipes.counters import change_counters
+from recipes.images import generate_renditions
+from recipes.models import (
+    Favorite, Recipe, ShoppingCart, ShoppingListItem, Subscription, User
+)
+from recipes.search import update_search_index
+from recipes.shortlinks import short_links
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_saved(instance, using, **kwargs):
+    update_search_index(instance, using)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_image_saved(instance, update_fields=None, **kwargs):
+    if update_fields is None or 'image' in update_fields:
+        generate_renditions(instance.image)
+
+
+@receiver(post_save, sender=User)
+def user_avatar_saved(instance, update_fields=None, **kwargs):
+    if update_fields is None or 'avatar' in update_fields:
+        generate_renditions(instance.avatar)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, using, **kwargs):
+    update_search_index(instance, using, deleted=True)
+    release_file(instance.image, using)
+    short_links.discard(instance.pk)
+
+
+@receiver(post_save, sender=Recipe)
+def recipe_created(instance, created, **kwargs):
+    if created:
+        short_links.discard(instance.pk)
+
+
+@receiver(post_delete, sender=User)
+def user_deleted(instance, using, **kwargs):
+    release_file(instance.avatar, using)
+
+
+def release_file(field_file, using):
+    """Удаляет файл после коммита, если на него больше нет ссылок."""
+    if field_file:
+        storage, name = field_file.storage, field_file.name
+        transaction.on_commit(lambda: storage.delete(name), using=using)
+
+
+@receiver(post_save, sender=ShoppingCart)
+def shopping_cart_added(instance, created, using, **kwargs):
+    if created:
+        ShoppingListItem.objects.db_manager(using).add_recipe(
+            instance.recipe_id, instance.user_id
+        )
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def shopping_cart_removed(instance, using, **kwargs):
+    # pre_delete: при каскадном удалении рецепта его продукты ещё на месте.
+    ShoppingListItem.objects.db_manager(using).remove_recipe(
+        instance.recipe_id, instance.user_id
+    )
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+def counted_object_created(instance, created, using, **kwargs):
+    if created:
+        change_counters(instance, 1, using)
+
+
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+def counted_object_deleted(instance, using, **kwargs):
+    change_counters(instance, -1, using)
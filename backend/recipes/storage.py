@@ -0,0 +1,87 @@
+import glob
+import hashlib
+import os
+import tempfile
+
+from django.apps import apps
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+from django.db.models import FileField
+
+INCOMING_DIR = '.incoming'
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """Хранит файлы под именем из SHA-256 содержимого.
+
+    Повторная загрузка того же файла не пишет новую копию, а возвращает
+    имя уже сохранённой. Удаляется файл, только если на него больше не
+    ссылается ни одно поле модели, вместе с производными файлами
+    (<имя>.<вариант>.<расширение>).
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        temporary_path, digest = self.write_incoming(content)
+        directory, filename = os.path.split(name)
+        _, extension = os.path.splitext(filename)
+        name = '/'.join(filter(None, (
+            directory, digest[:2], f'{digest}{extension.lower()}'
+        )))
+        if self.exists(name):
+            os.remove(temporary_path)
+        else:
+            self.move_into_place(temporary_path, name)
+        return name
+
+    def save_derived(self, name, content):
+        """Записывает файл под точным именем, заменяя существующий."""
+        temporary_path, _ = self.write_incoming(content)
+        self.move_into_place(temporary_path, name)
+        return name
+
+    def write_incoming(self, content):
+        directory = self.path(INCOMING_DIR)
+        os.makedirs(directory, exist_ok=True)
+        digest = hashlib.sha256()
+        with tempfile.NamedTemporaryFile(dir=directory, delete=False) as file:
+            for chunk in content.chunks():
+                if isinstance(chunk, str):
+                    chunk = chunk.encode()
+                digest.update(chunk)
+                file.write(chunk)
+        return file.name, digest.hexdigest()
+
+    def move_into_place(self, temporary_path, name):
+        full_path = self.path(name)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        if self.file_permissions_mode is not None:
+            os.chmod(temporary_path, self.file_permissions_mode)
+        os.replace(temporary_path, full_path)
+
+    def delete(self, name):
+        if not name or self.is_referenced(name):
+            return
+        super().delete(name)
+        root, _ = os.path.splitext(self.path(name))
+        for derived in glob.glob(f'{glob.escape(root)}.*.*'):
+            os.remove(derived)
+
+    def file_fields(self):
+        for model in apps.get_models():
+            for field in model._meta.concrete_fields:
+                if (
+                    isinstance(field, FileField)
+                    and isinstance(field.storage, type(self))
+                    and field.storage.location == self.location
+                ):
+                    yield model, field
+
+    def is_referenced(self, name):
+        return any(
+            model._default_manager.filter(**{field.name: name}).exists()
+            for model, field in self.file_fields()
+        )
@@ -0,0 +1,291 @@
+import gzip
+import json
+import os
+import tarfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Prefetch
+from django.utils.dateparse import parse_datetime
+
+from recipes.bulk import bulk_create_recipes
+from recipes.catalogue import batches, catalogue_imported
+from recipes.images import generate_renditions
+from recipes.models import Ingredient, Recipe, RecipeIngredient, Tag, User
+
+BATCH_SIZE = 1000
+AUTHOR_FIELDS = ('email', 'username', 'first_name', 'last_name')
+# Сколько изображений на процесс пула может ждать обработки.
+IMAGES_PER_WORKER = 4
+
+
+def open_lines(path, mode):
+    """Файл JSON Lines, сжатый gzip, если имя оканчивается на .gz."""
+    if path.endswith('.gz'):
+        return gzip.open(path, f'{mode}t', encoding='utf-8')
+    return open(path, mode, encoding='utf-8')
+
+
+def read_records(file):
+    for line in file:
+        if line.strip():
+            yield json.loads(line)
+
+
+def recipe_record(recipe):
+    return {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'created_at': recipe.created_at.isoformat(),
+        'image': recipe.image.name,
+        'author': {
+            field: getattr(recipe.author, field) for field in AUTHOR_FIELDS
+        },
+        'tags': [
+            {'name': tag.name, 'slug': tag.slug} for tag in recipe.tags.all()
+        ],
+        'ingredients': [
+            {
+                'name': item.ingredient.name,
+                'measurement_unit': item.ingredient.measurement_unit,
+                'amount': item.amount,
+            }
+            for item in recipe.recipeingredients.all()
+        ],
+    }
+
+
+def iterate_recipes(queryset, batch_size=BATCH_SIZE):
+    """Рецепты пачками по id со связями: iterator() в Django 3.2
+    не выполняет prefetch_related."""
+    queryset = queryset.select_related('author').prefetch_related(
+        'tags',
+        Prefetch(
+            'recipeingredients',
+            queryset=RecipeIngredient.objects.select_related('ingredient')
+        ),
+    ).order_by('id')
+    last_id = 0
+    while True:
+        batch = list(queryset.filter(id__gt=last_id)[:batch_size])
+        if not batch:
+            return
+        yield from batch
+        last_id = batch[-1].id
+
+
+def add_to_archive(archive, field_file):
+    storage, name = field_file.storage, field_file.name
+    if not storage.exists(name):
+        return False
+    info = tarfile.TarInfo(name)
+    info.size = storage.size(name)
+    info.mtime = storage.get_modified_time(name).timestamp()
+    with storage.open(name) as file:
+        archive.addfile(info, file)
+    return True
+
+
+def export_recipes(file, archive=None, queryset=None, batch_size=BATCH_SIZE):
+    """Пишет рецепты в file построчно в JSON, изображения (каждое один
+    раз) - в tar-архив archive. Возвращает количество рецептов."""
+    if queryset is None:
+        queryset = Recipe.objects.all()
+    archived = set()
+    count = 0
+    for recipe in iterate_recipes(queryset, batch_size):
+        file.write(json.dumps(recipe_record(recipe), ensure_ascii=False))
+        file.write('\n')
+        count += 1
+        name = recipe.image.name
+        if archive is not None and name and name not in archived:
+            archived.add(name)
+            add_to_archive(archive, recipe.image)
+    return count
+
+
+def store_image(name, content):
+    """Сохраняет изображение из архива в хранилище Recipe.image и создаёт
+    уменьшенные копии. Возвращает (имя в архиве, имя в хранилище)."""
+    field = Recipe._meta.get_field('image')
+    stored = field.storage.save(
+        field.generate_filename(None, os.path.basename(name)),
+        ContentFile(content, name)
+    )
+    generate_renditions(field.attr_class(None, field, stored))
+    return name, stored
+
+
+def import_images(archive, workers=1):
+    """Переносит изображения из tar-архива в хранилище. При workers > 1
+    запись и уменьшенные копии делаются в пуле процессов.
+
+    Возвращает {имя в архиве: имя в хранилище}.
+    """
+    images = (
+        (member.name, archive.extractfile(member).read())
+        for member in archive if member.isfile()
+    )
+    if workers <= 1:
+        return dict(store_image(name, content) for name, content in images)
+    names = {}
+    pending = set()
+    with ProcessPoolExecutor(workers) as executor:
+        for name, content in images:
+            pending.add(executor.submit(store_image, name, content))
+            if len(pending) >= workers * IMAGES_PER_WORKER:
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                names.update(future.result() for future in done)
+        names.update(future.result() for future in wait(pending).done)
+    return names
+
+
+class RecipeImporter:
+    """Загружает рецепты пачками через bulk_create.
+
+    Авторы (по почте), тэги (по slug) и продукты (по названию и единице
+    измерения) находятся по словарям в памяти, недостающие создаются.
+    Рецепт пропускается, если у автора уже есть рецепт с тем же
+    названием, поэтому прерванный импорт можно просто запустить снова:
+    каждая пачка сохраняется в своей транзакции.
+    """
+
+    def __init__(self, image_names=None, batch_size=BATCH_SIZE,
+                 using=DEFAULT_DB_ALIAS):
+        self.image_names = image_names or {}
+        self.batch_size = batch_size
+        self.using = using
+        self.authors = {}
+        self.tags = {
+            (slug,): id
+            for id, slug in Tag.objects.using(using).values_list('id', 'slug')
+        }
+        self.ingredients = {
+            (name, unit): id
+            for id, name, unit in Ingredient.objects.using(using).values_list(
+                'id', 'name', 'measurement_unit'
+            )
+        }
+        self.imported = self.skipped = 0
+
+    def run(self, records):
+        for batch in batches(records, self.batch_size):
+            with transaction.atomic(using=self.using):
+                self.import_batch(batch)
+        return self.imported
+
+    def resolve(self, model, lookup, items, key_fields, defaults=None):
+        """Дополняет lookup {ключ: id} объектами model для items,
+        создавая отсутствующие в базе."""
+        missing = {}
+        for item in items:
+            key = tuple(item[field] for field in key_fields)
+            if key not in lookup:
+                missing[key] = item
+        if not missing:
+            return
+        manager = model.objects.using(self.using)
+        # Словарь авторов заполняется по ходу импорта: сначала ищем в базе.
+        found = manager.filter(**{
+            f'{key_fields[0]}__in': {key[0] for key in missing}
+        }).values_list('id', *key_fields)
+        for id, *key in found:
+            lookup[tuple(key)] = id
+        created = [
+            model(**item, **(defaults or {}))
+            for key, item in missing.items() if key not in lookup
+        ]
+        if not created:
+            return
+        manager.bulk_create(created, ignore_conflicts=True)
+        for id, *key in manager.filter(**{
+            f'{key_fields[0]}__in': {
+                getattr(instance, key_fields[0]) for instance in created
+            }
+        }).values_list('id', *key_fields):
+            lookup[tuple(key)] = id
+        catalogue_imported.send(sender=model, result=None, using=self.using)
+
+    def import_batch(self, records):
+        self.resolve(
+            User, self.authors,
+            [
+                {field: record['author'][field] for field in AUTHOR_FIELDS}
+                for record in records
+            ],
+            ('email',),
+            {'password': make_password(None)}
+        )
+        self.resolve(
+            Tag, self.tags,
+            [tag for record in records for tag in record['tags']],
+            ('slug',)
+        )
+        self.resolve(
+            Ingredient, self.ingredients,
+            [
+                {
+                    'name': item['name'],
+                    'measurement_unit': item['measurement_unit']
+                }
+                for record in records for item in record['ingredients']
+            ],
+            ('name', 'measurement_unit')
+        )
+        existing = set(Recipe.objects.using(self.using).filter(
+            author_id__in=set(self.authors.values()),
+            name__in={record['name'] for record in records}
+        ).values_list('author_id', 'name'))
+        recipes = []
+        for record in records:
+            author_id = self.authors.get((record['author']['email'],))
+            if author_id is None or (author_id, record['name']) in existing:
+                self.skipped += 1
+                continue
+            existing.add((author_id, record['name']))
+            recipes.append((Recipe(
+                author_id=author_id,
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=self.image_names.get(record['image'], record['image']),
+            ), record))
+        if recipes:
+            self.create_recipes(recipes)
+
+    def create_recipes(self, recipes):
+        objects = bulk_create_recipes(
+            [
+                (recipe, self.tag_ids(record), self.amounts(record))
+                for recipe, record in recipes
+            ],
+            self.using,
+            # Уменьшенные копии созданы при переносе изображений.
+            renditions=False
+        )
+        # created_at с auto_now_add при вставке получает текущее время.
+        for recipe, record in recipes:
+            created_at = parse_datetime(record.get('created_at') or '')
+            if created_at is not None:
+                recipe.created_at = created_at
+        Recipe.objects.using(self.using).bulk_update(objects, ['created_at'])
+        self.imported += len(objects)
+
+    def tag_ids(self, record):
+        """id тэгов рецепта. Тэг, который не удалось создать из-за
+        совпадения названия с другим тэгом, пропускается."""
+        return {
+            self.tags[(tag['slug'],)] for tag in record['tags']
+            if (tag['slug'],) in self.tags
+        }
+
+    def amounts(self, record):
+        """{id продукта: мера}, повторы продукта в рецепте суммируются."""
+        amounts = {}
+        for item in record['ingredients']:
+            id = self.ingredients[(item['name'], item['measurement_unit'])]
+            amounts[id] = amounts.get(id, 0) + item['amount']
+        return amounts
@@ -1,10 +1,19 @@
-from django.urls import path
+from django.urls import path, re_path
 
 
-from recipes.views import redirect_short_link
+from recipes.views import redirect_legacy_short_link, redirect_short_link
 
 app_name = 'recipes'
 
 urlpatterns = [
-    path('<int:short_id>/', redirect_short_link, name='short-link-redirect'),
+    re_path(
+        r'^(?P<code>[a-zA-Z]+)/$',
+        redirect_short_link,
+        name='short-link-redirect'
+    ),
+    path(
+        '<int:short_id>/',
+        redirect_legacy_short_link,
+        name='legacy-short-link-redirect'
+    ),
 ]
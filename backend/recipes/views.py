@@ -1,11 +1,21 @@
-from django.shortcuts import redirect
 from django.http import Http404
-from recipes.models import Recipe
+from django.shortcuts import redirect
+
+from recipes.shortlinks import short_links
+
+
+def redirect_to_recipe(recipe_id):
+    if recipe_id is None:
+        raise Http404('Рецепт с таким ID не найден')
+    return redirect(f'/recipes/{recipe_id}/')
+
+
+def redirect_short_link(request, code):
+    return redirect_to_recipe(short_links.resolve(code))
 
 
-def redirect_short_link(request, short_id):
-    return (
-        redirect(f'/recipes/{short_id}/')
-        if Recipe.objects.filter(id=short_id).exists()
-        else Http404('Рецепт с таким ID не найден')
+def redirect_legacy_short_link(request, short_id):
+    """Ссылки /s/<id>/, выданные до появления буквенных кодов."""
+    return redirect_to_recipe(
+        short_id if short_links.exists(short_id) else None
     )